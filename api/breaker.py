@@ -0,0 +1,166 @@
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ventana móvil de observaciones por tienda (segundos y máximo de muestras)
+BREAKER_WINDOW = float(os.environ.get("BREAKER_WINDOW", "60"))
+BREAKER_MAX_SAMPLES = 200
+# Se abre el circuito si en la ventana hay al menos MIN_REQUESTS llamadas y falla esta fracción
+BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_REQUESTS = 8
+# Tiempo que el circuito queda abierto antes de dejar pasar una llamada de prueba
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "30"))
+
+# Timeout por intento = p99 de las latencias buenas * factor, entre MIN y MAX.
+# Hasta tener ADAPTIVE_MIN_SAMPLES muestras se usa MAX (el timeout fijo de antes).
+TIMEOUT_MIN = 3.0
+TIMEOUT_MAX = 15.0
+TIMEOUT_FACTOR = 2.0
+ADAPTIVE_MIN_SAMPLES = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """La tienda está fallando: se rechaza la llamada sin tocar la red."""
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[idx]
+
+
+class CircuitBreaker:
+    """Circuit breaker con ventana móvil de errores y latencias de un upstream.
+
+    closed -> open cuando la tasa de fallos supera `failure_rate`; open -> half_open pasado
+    `open_seconds`; en half_open pasa una sola llamada de prueba: si va bien se cierra, si
+    falla se vuelve a abrir. Las cancelaciones (hedging, first_success) no cuentan.
+    """
+
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, failure_rate: float = BREAKER_FAILURE_RATE,
+                 min_requests: int = BREAKER_MIN_REQUESTS, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.window = window
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._probe_in_flight = False
+        # (instante, ok, latencia en segundos)
+        self._samples: Deque[Tuple[float, bool, float]] = deque(maxlen=BREAKER_MAX_SAMPLES)
+
+    def _trim(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def _latencies(self):
+        return sorted(lat for _, ok, lat in self._samples if ok)
+
+    def timeout(self) -> float:
+        """Timeout para el siguiente intento según el p99 observado."""
+        self._trim(time.monotonic())
+        lats = self._latencies()
+        if len(lats) < ADAPTIVE_MIN_SAMPLES:
+            return TIMEOUT_MAX
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, _percentile(lats, 0.99) * TIMEOUT_FACTOR))
+
+    def before_call(self) -> bool:
+        """Lanza CircuitOpenError si no se debe llamar. Devuelve True si la llamada es la de prueba."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit open")
+            self.state = HALF_OPEN
+            logger.info("Circuit %s half-open, probing", self.name)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit half-open (probe in flight)")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self, probe: bool) -> None:
+        """La llamada se canceló sin resultado: libera el hueco de prueba si lo tenía."""
+        if probe:
+            self._probe_in_flight = False
+
+    def _open(self, now: float) -> None:
+        if self.state != OPEN:
+            logger.warning("Circuit %s open", self.name)
+        self.state = OPEN
+        self.opened_at = now
+
+    def record(self, ok: bool, latency: float, probe: bool = False) -> None:
+        now = time.monotonic()
+        self._samples.append((now, ok, latency))
+        if probe:
+            self._probe_in_flight = False
+            if ok:
+                logger.info("Circuit %s closed", self.name)
+                self.state = CLOSED
+                # Empezar de cero: los fallos que lo abrieron ya no cuentan
+                self._samples.clear()
+                self._samples.append((now, ok, latency))
+            else:
+                self._open(now)
+            return
+        if self.state != CLOSED:
+            return
+        self._trim(now)
+        total = len(self._samples)
+        if total >= self.min_requests:
+            failures = sum(1 for _, s_ok, _ in self._samples if not s_ok)
+            if failures / total >= self.failure_rate:
+                self._open(now)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        lats = self._latencies()
+        total = len(self._samples)
+        failures = sum(1 for _, ok, _ in self._samples if not ok)
+        return {
+            "state": self.state,
+            "requests": total,
+            "failures": failures,
+            "error_rate": round(failures / total, 3) if total else 0.0,
+            "p50_ms": round(_percentile(lats, 0.50) * 1000, 1),
+            "p99_ms": round(_percentile(lats, 0.99) * 1000, 1),
+            "timeout_s": round(self.timeout(), 2),
+            "rejected": self.rejected,
+            "open_for_s": round(max(0.0, self.open_seconds - (now - self.opened_at)), 1) if self.state == OPEN else 0.0,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_states() -> Dict[str, dict]:
+    return {name: b.snapshot() for name, b in sorted(_breakers.items())}
+
+
+metrics.register(metrics.Gauge(
+    "gph_circuit_open", "1 si el circuito de la tienda está abierto o a prueba", ("upstream",),
+    collect=lambda: {(name,): int(b.state != CLOSED) for name, b in _breakers.items()},
+))
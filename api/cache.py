@@ -0,0 +1,194 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from api.utils import _normalize_text
+from api.concurrency import SingleFlight
+from api import deadline, metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Máximo de respuestas guardadas entre todas las tiendas (LRU)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "2048"))
+# TTL por defecto si el adaptador no define el suyo
+DEFAULT_TTL = 10 * 60
+# Resultados vacíos (sin coincidencias) se guardan menos tiempo
+NEGATIVE_TTL = 2 * 60
+# Tras expirar, una entrada se sigue sirviendo este tiempo mientras se refresca en segundo plano
+STALE_TTL = 10 * 60
+# Presupuesto de una carga compartida (segundos): el del STORE_TIMEOUTS más largo de api/stores.py
+FETCH_BUDGET = float(os.environ.get("CACHE_FETCH_BUDGET", "12"))
+
+
+# Dentro de refreshing() no se sirven entradas guardadas: se vuelve a pedir a la tienda y se guarda
+_refreshing: contextvars.ContextVar[bool] = contextvars.ContextVar("gph_cache_refreshing", default=False)
+
+
+@contextmanager
+def refreshing() -> Iterator[None]:
+    """Las lecturas de caché dentro del bloque van siempre a la tienda (y actualizan la caché)."""
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+def is_refreshing() -> bool:
+    return _refreshing.get()
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "stale_until")
+
+    def __init__(self, value: Any, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.expires = now + ttl
+        self.stale_until = self.expires + stale_ttl
+
+
+class ResponseCache:
+    """Caché async en memoria con TTL por tienda, LRU y stale-while-revalidate.
+
+    Las excepciones (y los resultados con errores tragados) no se cachean; los vacíos usan `negative_ttl`.
+    Los fallos de caché concurrentes para la misma clave comparten una sola petición upstream.
+    Los valores se comparten entre llamadas: quien los recibe no debe mutarlos.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, negative_ttl: float = NEGATIVE_TTL, stale_ttl: float = STALE_TTL,
+                 fetch_budget: float = FETCH_BUDGET):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.fetch_budget = fetch_budget
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self._inflight = SingleFlight()
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def _set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if not value:
+            ttl = min(ttl, self.negative_ttl)
+        self._entries[key] = _Entry(value, ttl, self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            metrics.cache_evictions.inc()
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        async def _load():
+            # La carga la comparten todas las peticiones que piden la clave: con presupuesto propio
+            # (no el de la primera que llegó), y cada una la espera solo lo que le queda del suyo
+            with deadline.standalone(self.fetch_budget) as budget, deadline.tracking_errors() as errors:
+                value = await fetch()
+            # Un resultado recortado por falta de tiempo o con errores tragados no se guarda
+            if not budget.exhausted and not errors:
+                self._set(key, value, ttl)
+            return value, budget.exhausted, errors
+
+        fut = self._inflight.future(key, _load)
+        remaining = deadline.remaining()
+        if remaining is None:
+            value, truncated, errors = await asyncio.shield(fut)
+        else:
+            done, _ = await asyncio.wait({fut}, timeout=max(0.0, remaining))
+            if not done:
+                deadline.mark_exhausted()
+                raise deadline.DeadlineExceeded("request budget exhausted waiting for a shared fetch")
+            value, truncated, errors = fut.result()
+        if truncated:
+            deadline.mark_exhausted()
+        # Cada petición que espera la carga hereda sus errores tragados
+        for error in errors:
+            deadline.note_error(error)
+        return value
+
+    @property
+    def coalesced(self) -> int:
+        return self._inflight.coalesced
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float) -> None:
+        # El refresco no pertenece a la petición que lo disparó: sin su presupuesto ni su traza
+        deadline.detach()
+        tracing.detach()
+        try:
+            await self._fetch(key, fetch, ttl)
+        except Exception as e:
+            # Se sigue sirviendo el valor viejo hasta stale_until
+            logger.debug("Background refresh failed for %s: %s", key, e)
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float = DEFAULT_TTL) -> Any:
+        # Las claves de @cached empiezan por el nombre de la tienda
+        store = key[0] if isinstance(key, tuple) and key else ""
+        if _refreshing.get():
+            metrics.cache_requests.inc(store, "refresh")
+            return await self._fetch(key, fetch, ttl)
+        entry = self._entries.get(key)
+        if entry is not None:
+            now = time.monotonic()
+            if now < entry.expires:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                metrics.cache_requests.inc(store, "hit")
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self.stats["stale"] += 1
+                metrics.cache_requests.inc(store, "stale")
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.ensure_future(self._refresh(key, fetch, ttl))
+                return entry.value
+            del self._entries[key]
+
+        self.stats["misses"] += 1
+        metrics.cache_requests.inc(store, "miss")
+        return await self._fetch(key, fetch, ttl)
+
+
+response_cache = ResponseCache()
+
+metrics.register(metrics.Gauge("gph_cache_entries", "Entradas en la caché de respuestas", collect=lambda: {(): len(response_cache)}))
+
+
+def _default_key(arguments: Dict[str, Any]) -> Tuple:
+    return tuple(_normalize_text(v) if isinstance(v, str) else v for v in arguments.values())
+
+
+def cached(store: str, ttl: float = DEFAULT_TTL, key: Optional[Callable[..., Tuple]] = None):
+    """Decorador para adaptadores async: cachea el resultado en `response_cache`.
+
+    La clave es (store, *argumentos) con los textos normalizados, o (store, *key(**argumentos))
+    si se pasa `key` (necesario cuando algún argumento no es hashable).
+    """
+
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parts = key(**bound.arguments) if key else _default_key(bound.arguments)
+            return await response_cache.get_or_fetch((store, *parts), lambda: fn(*args, **kwargs), ttl)
+
+        wrapper.uncached = fn
+        return wrapper
+
+    return decorator
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from api.http_client import get_http_client
+from api.utils import _normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Volcado de la lista de apps de Steam (formato de ISteamApps/GetAppList/v2)
+CATALOG_PATH = Path(os.environ.get("STEAM_APPLIST_PATH", Path(__file__).resolve().parent.parent / "data" / "steam_applist.json"))
+# De dónde se descarga/refresca el volcado ("" = no descargar, solo usar el archivo)
+CATALOG_URL = os.environ.get("STEAM_APPLIST_URL", "https://api.steampowered.com/ISteamApps/GetAppList/v2/")
+CATALOG_REFRESH_INTERVAL = float(os.environ.get("STEAM_APPLIST_REFRESH", str(24 * 60 * 60)))
+
+# GetAppList incluye todo lo que tiene appid, no solo juegos: se descartan las apps cuyo nombre
+# lleva alguna de estas palabras (bandas sonoras, demos, servidores dedicados, SDK, herramientas,
+# apps de prueba...). Se compara por palabra normalizada ("demo" no descarta "Demon's Souls").
+_NON_GAME_WORDS = frozenset((
+    "soundtrack", "soundtracks", "ost", "demo", "demos", "playtest", "extra", "extras",
+    "server", "servers", "sdk", "tool", "tools", "toolkit", "editor", "benchmark", "trailer",
+    "teaser", "artbook", "wallpaper", "wallpapers",
+))
+# "test" o "beta" sueltos descartarían juegos ("Test Drive Unlimited"): solo en estas frases
+_NON_GAME_PHRASES = ("test app", "test server", "public test", "closed beta", "open beta", "beta test")
+# Si el volcado trae el tipo de cada app (p. ej. exportado de IStoreService/GetAppList), solo estos
+_GAME_TYPES = frozenset(("game", "dlc"))
+# Un prefijo de token que abarque más apps que esto no se expande (p. ej. "a")
+_MAX_POSTINGS_PER_TERM = 20000
+
+
+def _is_non_game(norm: str) -> bool:
+    """Nombre normalizado de algo que no es un juego (servidor dedicado, demo, SDK...)."""
+    return not _NON_GAME_WORDS.isdisjoint(norm.split()) or any(p in norm for p in _NON_GAME_PHRASES)
+
+
+def _prefix_range(keys: List[str], prefix: str) -> Tuple[int, int]:
+    """Rango [lo, hi) de `keys` (ordenadas) que empiezan por `prefix`."""
+    lo = bisect_left(keys, prefix)
+    hi = bisect_left(keys, prefix + "\uffff", lo)
+    return lo, hi
+
+
+class AppIndex:
+    """Índice inmutable de apps de Steam para autocompletar sin llamar a Steam.
+
+    Todo va en listas ordenadas y arrays compactos (sin un dict por nodo):
+    - nombres normalizados ordenados: búsqueda por prefijo del título completo con bisect
+      (equivale a recorrer un trie, pero en memoria contigua);
+    - índice invertido de tokens en formato CSR (`_token_offsets` / `_token_apps`): la query
+      casa si cada una de sus palabras es prefijo de alguna palabra del título.
+    """
+
+    def __init__(self, apps: Iterable[Tuple[int, str]]):
+        rows = []
+        for appid, name in apps:
+            name = (name or "").strip()
+            norm = _normalize_text(name)
+            if norm and not _is_non_game(norm):
+                rows.append((norm, int(appid), name))
+        rows.sort()
+
+        self._norms: List[str] = [r[0] for r in rows]
+        self._appids = array("I", (r[1] for r in rows))
+        self._names: List[str] = [r[2] for r in rows]
+
+        postings = {}
+        for i, norm in enumerate(self._norms):
+            for token in set(norm.split()):
+                postings.setdefault(token, []).append(i)
+        self._tokens: List[str] = sorted(postings)
+        self._token_offsets = array("I", [0])
+        self._token_apps = array("I")
+        for token in self._tokens:
+            self._token_apps.extend(postings[token])
+            self._token_offsets.append(len(self._token_apps))
+
+    def __len__(self) -> int:
+        return len(self._appids)
+
+    def _apps_for_prefix(self, prefix: str) -> Optional[set]:
+        lo, hi = _prefix_range(self._tokens, prefix)
+        start, end = self._token_offsets[lo], self._token_offsets[hi]
+        if end - start > _MAX_POSTINGS_PER_TERM:
+            return None
+        return set(self._token_apps[start:end])
+
+    def search(self, query: str, limit: int = 8) -> List[Tuple[int, str]]:
+        """(appid, nombre) que casan con `query`: primero los títulos que empiezan por la
+        query y luego los que contienen todas sus palabras; los títulos cortos antes."""
+        q = _normalize_text(query)
+        if not q:
+            return []
+
+        lo, hi = _prefix_range(self._norms, q)
+        found = sorted(range(lo, min(hi, lo + 500)), key=lambda i: len(self._norms[i]))[:limit]
+
+        if len(found) < limit:
+            candidates = None
+            # Empezar por los términos más largos (más selectivos)
+            for term in sorted(q.split(), key=len, reverse=True):
+                apps = self._apps_for_prefix(term)
+                if apps is None:
+                    continue
+                candidates = apps if candidates is None else candidates & apps
+                if not candidates:
+                    break
+            if candidates:
+                seen = set(found)
+                extra = sorted((i for i in candidates if i not in seen), key=lambda i: len(self._norms[i]))
+                # Comprobar los términos que no se expandieron (demasiado comunes)
+                terms = q.split()
+                for i in extra:
+                    words = self._norms[i].split()
+                    if all(any(w.startswith(t) for w in words) for t in terms):
+                        found.append(i)
+                        if len(found) >= limit:
+                            break
+
+        return [(self._appids[i], self._names[i]) for i in found]
+
+
+def _parse_applist(raw: bytes) -> List[Tuple[int, str]]:
+    data = json.loads(raw)
+    if isinstance(data, dict):
+        data = data.get("applist", data).get("apps", [])
+    return [
+        (a["appid"], a.get("name", "")) for a in data
+        if a.get("appid") and str(a.get("type", "game")).lower() in _GAME_TYPES
+    ]
+
+
+class SteamCatalog:
+    """Catálogo de apps cargado desde un volcado en disco y refrescado en segundo plano."""
+
+    def __init__(self, path: Path = CATALOG_PATH, url: str = CATALOG_URL, refresh_interval: float = CATALOG_REFRESH_INTERVAL):
+        self.path = Path(path)
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.index: Optional[AppIndex] = None
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None and len(self.index) > 0
+
+    def search(self, query: str, limit: int = 8) -> List[Tuple[int, str]]:
+        return self.index.search(query, limit) if self.index is not None else []
+
+    async def _build(self, raw: bytes) -> None:
+        # Parsear y ordenar ~200k títulos lleva segundos: fuera del event loop
+        index = await asyncio.to_thread(lambda: AppIndex(_parse_applist(raw)))
+        self.index = index
+        self.loaded_at = time.time()
+        logger.info("Steam catalog loaded: %s apps", len(index))
+
+    async def load_file(self) -> bool:
+        if not self.path.is_file():
+            return False
+        raw = await asyncio.to_thread(self.path.read_bytes)
+        await self._build(raw)
+        return True
+
+    async def refresh(self) -> None:
+        if not self.url:
+            return
+        client = await get_http_client()
+        resp = await client.get(self.url, timeout=60.0)
+        resp.raise_for_status()
+        raw = resp.content
+        await self._build(raw)
+
+        def _save():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_bytes(raw)
+            tmp.replace(self.path)
+
+        await asyncio.to_thread(_save)
+
+    async def run(self) -> None:
+        """Carga el volcado (o lo descarga si no existe) y lo refresca cada `refresh_interval`."""
+        try:
+            loaded = await self.load_file()
+        except Exception as e:
+            logger.warning("Could not load Steam catalog from %s: %s", self.path, e)
+            loaded = False
+        if loaded and self.refresh_interval <= 0:
+            return
+        delay = self.refresh_interval if loaded else 0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Steam catalog refresh failed: %s", e)
+            if self.refresh_interval <= 0:
+                return
+            delay = self.refresh_interval
+
+
+steam_catalog = SteamCatalog()
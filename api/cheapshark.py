@@ -1,95 +1,113 @@
 from typing import List, Dict, Optional
+import asyncio
 import logging
 
-from api.http_client import get_http_client
-from api.utils import _normalize_text, _similar
+from api.http_client import upstream_get
+from api.utils import TitleMatcher
+from api.cache import cached
+from api import deadline
 
 BASE_URL = "https://www.cheapshark.com/api/1.0"
+CHEAPSHARK_CACHE_TTL = 10 * 60
+# /games?ids= admite hasta 25 ids por llamada
+DETAILS_CHUNK_SIZE = 10
 
 logger = logging.getLogger(__name__)
 
 
-def _title_matches_query(q_norm: str, title: str, min_similarity: float = 0.35) -> bool:
-    if not q_norm or not title:
-        return False
-    t_norm = _normalize_text(title)
-    if q_norm in t_norm:
-        return True
-    words = [w for w in q_norm.split() if len(w) >= 2]
-    if words and sum(1 for w in words if w in t_norm) >= max(1, len(words) * 0.5):
-        return True
-    return _similar(q_norm, t_norm) >= min_similarity
+async def _fetch_details(game_ids: List[str]) -> Dict[str, Dict]:
+    resp = await upstream_get("cheapshark", f"{BASE_URL}/games", params={"ids": ",".join(game_ids)})
+    resp.raise_for_status()
+    return resp.json() or {}
 
 
-async def cheapshark_search(q: str, limit: int = 3) -> List[Dict]:
-    """Search CheapShark for the query and return matches for Fanatical (storeID == '15')."""
-    client = await get_http_client()
+def _fanatical_deal(juego: Dict, details: Dict, matcher: TitleMatcher) -> Optional[Dict]:
+    """Mejor oferta de Fanatical (storeID 15) para un juego, o None si no aplica."""
+    info = details.get("info", {})
+    title = info.get("title") or juego.get("external") or ""
+    if not title:
+        return None
+
+    if not matcher.matches(title):
+        return None
+
+    deals = [d for d in details.get("deals", []) if d.get("storeID") == "15"]
+    if not deals:
+        return None
+
+    best = min(deals, key=lambda d: float(d.get("price", 9999)))
+    usd_price = float(best.get("price", 0.0))
+    retail = best.get("retailPrice")
+    retail_float = float(retail) if (retail is not None and retail != "") else None
+
+    savings = best.get("savings")
     try:
-        resp = await client.get(
-            f"{BASE_URL}/games",
-            params={"title": q, "limit": 20, "exact": 0},
-            timeout=15.0,
-        )
-        resp.raise_for_status()
-        juegos = resp.json() or []
-    except Exception as e:
-        logger.debug("CheapShark /games failed: %s", e)
-        return []
+        savings_int = int(float(savings))
+    except Exception:
+        savings_int = 0
 
-    if not juegos:
-        return []
+    redirect = f"https://www.cheapshark.com/redirect?dealID={best.get('dealID')}"
+    thumb = info.get("thumb") or ""
 
-    res = []
-    q_norm = _normalize_text(q)
-
-    for juego in juegos:
-        if len(res) >= limit:
-            break
-        try:
-            game_id = juego.get("gameID")
-            if not game_id:
-                continue
-            details_resp = await client.get(f"{BASE_URL}/games", params={"id": game_id}, timeout=15.0)
-            details_resp.raise_for_status()
-            details = details_resp.json()
+    return {
+        "nombre": title,
+        "precio_final": usd_price,
+        "original_price": retail_float,
+        "descuento": savings_int,
+        "url": redirect,
+        "tiny_image": thumb,
+        "tienda": "Fanatical",
+    }
 
-            info = details.get("info", {})
-            title = info.get("title") or juego.get("external") or ""
-            if not title:
-                continue
 
-            if not _title_matches_query(q_norm, title):
-                continue
+@cached("fanatical", ttl=CHEAPSHARK_CACHE_TTL)
+async def cheapshark_search(q: str, limit: int = 3) -> List[Dict]:
+    """Search CheapShark for the query and return matches for Fanatical (storeID == '15')."""
+    # Los errores de CheapShark se propagan (no se devuelve []) para que la caché no los guarde
+    resp = await upstream_get(
+        "cheapshark",
+        f"{BASE_URL}/games",
+        params={"title": q, "limit": 20, "exact": 0},
+    )
+    resp.raise_for_status()
+    juegos = resp.json() or []
 
-            deals = [d for d in details.get("deals", []) if d.get("storeID") == "15"]
-            if not deals:
-                continue
+    if not juegos:
+        return []
 
-            best = min(deals, key=lambda d: float(d.get("price", 9999)))
-            usd_price = float(best.get("price", 0.0))
-            retail = best.get("retailPrice")
-            retail_float = float(retail) if (retail is not None and retail != "") else None
+    res = []
+    matcher = TitleMatcher(q, min_word_ratio=0.5)
 
-            savings = best.get("savings")
+    # Detalles por lotes con /games?ids=a,b,c (en paralelo); se procesan en orden y en cuanto
+    # hay `limit` resultados se cancelan los lotes que falten. Solo el fallo de la búsqueda se propaga
+    juegos = [j for j in juegos if j.get("gameID")]
+    chunks = [juegos[i:i + DETAILS_CHUNK_SIZE] for i in range(0, len(juegos), DETAILS_CHUNK_SIZE)]
+    tasks = [asyncio.ensure_future(_fetch_details([j["gameID"] for j in chunk])) for chunk in chunks]
+    try:
+        for chunk, task in zip(chunks, tasks):
+            if len(res) >= limit:
+                break
             try:
-                savings_int = int(float(savings))
-            except Exception:
-                savings_int = 0
-
-            redirect = f"https://www.cheapshark.com/redirect?dealID={best.get('dealID')}"
-            thumb = info.get("thumb") or ""
-
-            res.append({
-                "nombre": title,
-                "precio_final": usd_price,
-                "original_price": retail_float,
-                "descuento": savings_int,
-                "url": redirect,
-                "tiny_image": thumb,
-                "tienda": "Fanatical",
-            })
-        except Exception as e:
-            logger.debug("CheapShark processing failed for juego %s: %s", juego, e)
-            continue
+                details_by_id = await task
+            except Exception as e:
+                # Un lote fallido solo deja sin detalles a sus juegos; la respuesta queda marcada como parcial
+                logger.debug("CheapShark details failed for %s games: %s", len(chunk), e)
+                deadline.note_error(e)
+                continue
+            for juego in chunk:
+                if len(res) >= limit:
+                    break
+                try:
+                    deal = _fanatical_deal(juego, details_by_id.get(str(juego["gameID"])) or {}, matcher)
+                except Exception as e:
+                    logger.debug("CheapShark processing failed for juego %s: %s", juego, e)
+                    continue
+                if deal:
+                    res.append(deal)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Recoger los lotes cancelados (o fallidos sin esperar) para que no queden excepciones sin leer
+        await asyncio.gather(*tasks, return_exceptions=True)
 
     return res
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+K = TypeVar("K", bound=Hashable)
+
+
+async def gather_bounded(func: Callable[[T], Awaitable[R]], items: Iterable[T], limit: int = 8) -> List[R]:
+    """Ejecuta func(item) para cada item con como mucho `limit` llamadas simultáneas.
+
+    Devuelve los resultados en el mismo orden que `items`; si una llamada falla
+    se devuelve la excepción en su posición (como gather(return_exceptions=True)).
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def _run(item: T):
+        async with sem:
+            return await func(item)
+
+    return await asyncio.gather(*(_run(item) for item in items), return_exceptions=True)
+
+
+async def iter_bounded(func: Callable[[T], Awaitable[R]], items: Iterable[T], limit: int = 8) -> AsyncIterator[Union[R, BaseException]]:
+    """Como gather_bounded, pero entrega el resultado (o la excepción) de cada item en orden en
+    cuanto está listo. Si el consumidor deja de iterar (break), las llamadas en vuelo se cancelan
+    y las que esperaban turno ya no se lanzan.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def _run(item: T):
+        async with sem:
+            return await func(item)
+
+    tasks = [asyncio.ensure_future(_run(item)) for item in items]
+    try:
+        for task in tasks:
+            await asyncio.wait({task})
+            yield task.exception() or task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_hedged(funcs: Sequence[Callable[[], Awaitable[R]]], hedge_delay: float) -> AsyncIterator[Tuple[int, Union[R, BaseException]]]:
+    """Lanza funcs[0] y, si en `hedge_delay` segundos no ha terminado (o en cuanto termina
+    cualquiera sin que el consumidor haya parado), lanza la siguiente.
+
+    Entrega (índice, resultado o excepción) según van terminando. Si el consumidor deja de
+    iterar (break), las llamadas que sigan en vuelo se cancelan.
+    """
+    pending: Dict[asyncio.Future, int] = {}
+    next_i = 0
+
+    def _launch():
+        nonlocal next_i
+        pending[asyncio.ensure_future(funcs[next_i]())] = next_i
+        next_i += 1
+
+    if funcs:
+        _launch()
+    try:
+        while pending:
+            timeout = hedge_delay if next_i < len(funcs) else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                _launch()
+                continue
+            for fut in done:
+                i = pending.pop(fut)
+                yield i, (fut.exception() or fut.result())
+            if next_i < len(funcs):
+                _launch()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+async def first_success(funcs: Sequence[Callable[[], Awaitable[R]]], accept: Callable[[R], bool] = bool) -> Tuple[Optional[int], List[Union[R, BaseException, None]]]:
+    """Lanza todas las funcs a la vez y se queda con la primera cuyo resultado cumpla `accept`;
+    las demás se cancelan. Devuelve (índice ganador o None, resultados/excepciones por índice;
+    None en las que se cancelaron)."""
+    tasks = [asyncio.ensure_future(f()) for f in funcs]
+    index = {t: i for i, t in enumerate(tasks)}
+    outcomes: List[Union[R, BaseException, None]] = [None] * len(tasks)
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                i = index[t]
+                outcomes[i] = t.exception() or t.result()
+                if not isinstance(outcomes[i], BaseException) and accept(outcomes[i]):
+                    return i, outcomes
+        return None, outcomes
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+class SingleFlight:
+    """Agrupa llamadas idénticas en vuelo: mientras una llamada con la misma clave no
+    termina, las demás esperan su resultado en lugar de repetir la petición upstream.
+
+    Cancelar a uno de los que esperan no cancela la llamada compartida.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        # Evita "exception was never retrieved" si todos los que esperaban se cancelaron
+        if not fut.cancelled():
+            fut.exception()
+
+    def future(self, key: Hashable, func: Callable[[], Awaitable[R]]) -> "asyncio.Future[R]":
+        """Futuro compartido de la llamada con esa clave (la lanza si no hay ninguna en vuelo).
+
+        Quien lo espere debe hacerlo sin cancelarlo (asyncio.shield o asyncio.wait).
+        """
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(func())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self.coalesced += 1
+        return fut
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[R]]) -> R:
+        return await asyncio.shield(self.future(key, func))
+
+
+class BatchLoader:
+    """Micro-batching estilo DataLoader: las claves pedidas (desde cualquier petición) dentro
+    de una ventana de `window` segundos se resuelven con una sola llamada a `batch_fn`.
+
+    `batch_fn` recibe la lista de claves y devuelve un dict clave -> valor; si el valor es una
+    excepción (o falta la clave) se lanza solo a quien pidió esa clave.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[K]], Awaitable[Dict[K, R]]], window: float = 0.008, max_batch: int = 50):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[K, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+
+    async def load(self, key: K) -> R:
+        fut = self._pending.get(key)
+        if fut is None:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._pending[key] = fut
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._dispatch)
+        return await asyncio.shield(fut)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: Dict[K, asyncio.Future]) -> None:
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            results = {key: e for key in batch}
+        for key, fut in batch.items():
+            if fut.done():
+                continue
+            value = results.get(key, KeyError(key))
+            if isinstance(value, BaseException):
+                fut.set_exception(value)
+                # Marcar como recuperada si nadie espera ya este future
+                fut.exception()
+            else:
+                fut.set_result(value)
+
+
+class RateLimiter:
+    """Token bucket async: como mucho `rate` adquisiciones por segundo, con ráfagas de hasta `burst`.
+
+    Los que esperan pasan en orden de llegada.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
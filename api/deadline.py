@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# Presupuesto total (segundos) de una petición entrante si el cliente no pide otro
+DEFAULT_BUDGET = float(os.environ.get("REQUEST_BUDGET", "12"))
+MAX_BUDGET = 30.0
+MIN_BUDGET = 0.1
+BUDGET_PARAM = "budget"
+BUDGET_HEADER = b"x-request-budget"
+PARTIAL_HEADER = b"x-partial-results"
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Se acabó el presupuesto de la petición antes de poder llamar (o terminar de llamar) a la tienda."""
+
+
+class Budget:
+    """Deadline absoluto (time.monotonic) de una petición.
+
+    `exhausted` indica que alguna llamada se saltó o se cortó por falta de tiempo, es decir,
+    que la respuesta es parcial. Los presupuestos hijos lo propagan al padre.
+    """
+
+    __slots__ = ("deadline", "exhausted", "parent")
+
+    def __init__(self, deadline: float, parent: Optional["Budget"] = None):
+        self.deadline = deadline
+        self.exhausted = False
+        self.parent = parent
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def mark_exhausted(self) -> None:
+        budget = self
+        while budget is not None:
+            budget.exhausted = True
+            budget = budget.parent
+
+
+_current: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar("request_budget", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Segundos que le quedan a la petición actual (None fuera de una petición)."""
+    budget = _current.get()
+    return budget.remaining() if budget is not None else None
+
+
+def clamp(timeout: float) -> float:
+    """`timeout` recortado a lo que le queda a la petición."""
+    rem = remaining()
+    return timeout if rem is None else max(0.0, min(timeout, rem))
+
+
+def mark_exhausted() -> None:
+    budget = _current.get()
+    if budget is not None:
+        budget.mark_exhausted()
+
+
+def exhausted() -> bool:
+    budget = _current.get()
+    return budget is not None and budget.exhausted
+
+
+@contextmanager
+def standalone(seconds: float) -> Iterator[Budget]:
+    """Presupuesto propio de `seconds`, sin relación con el de la petición actual: para trabajo
+    que comparten varias peticiones (p. ej. una carga de la caché) y no debe heredar el plazo de
+    la primera que llegó. Cada petición acota por su cuenta cuánto lo espera."""
+    budget = Budget(time.monotonic() + seconds)
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def detach() -> None:
+    """Quita el presupuesto (y los errores anotados) del contexto actual: tareas en segundo plano
+    que sobreviven a la petición."""
+    _current.set(None)
+    _swallowed.set(())
+
+
+# Errores que la petición se tragó para responder con lo que había: la respuesta también es parcial.
+# Cada tracking_errors() abierto recibe los errores anotados dentro de él (los anidados incluidos)
+_swallowed: contextvars.ContextVar[Tuple[List[BaseException], ...]] = contextvars.ContextVar("gph_swallowed_errors", default=())
+
+
+@contextmanager
+def tracking_errors() -> Iterator[List[BaseException]]:
+    """Recoge en la lista devuelta los errores anotados con note_error() dentro del bloque."""
+    errors: List[BaseException] = []
+    token = _swallowed.set(_swallowed.get() + (errors,))
+    try:
+        yield errors
+    finally:
+        _swallowed.reset(token)
+
+
+def note_error(error: BaseException) -> None:
+    """Anota un error tragado: el resultado se responde igual, pero marcado como parcial, sin
+    guardarse en la base de precios ni en cachés."""
+    for errors in _swallowed.get():
+        errors.append(error)
+
+
+def _parse_budget(value) -> Optional[float]:
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+    return min(MAX_BUDGET, max(MIN_BUDGET, seconds))
+
+
+class DeadlineMiddleware:
+    """ASGI: fija el presupuesto de cada petición (`?budget=` o `X-Request-Budget`, en segundos;
+    si no, DEFAULT_BUDGET) y marca la respuesta con `X-Partial-Results: true` si se agotó o si
+    se tragó algún error de una tienda (note_error)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = None
+        query = scope.get("query_string", b"")
+        if query:
+            values = parse_qs(query.decode("latin-1")).get(BUDGET_PARAM)
+            if values:
+                seconds = _parse_budget(values[0])
+        if seconds is None:
+            for name, value in scope["headers"]:
+                if name == BUDGET_HEADER:
+                    seconds = _parse_budget(value.decode("latin-1"))
+                    break
+        if seconds is None:
+            seconds = DEFAULT_BUDGET
+
+        budget = Budget(time.monotonic() + seconds)
+        token = _current.set(budget)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and (budget.exhausted or errors):
+                message["headers"] = list(message.get("headers", [])) + [(PARTIAL_HEADER, b"true")]
+            await send(message)
+
+        try:
+            with tracking_errors() as errors:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -1,12 +1,20 @@
 import re
 import json
+import time
+import asyncio
 import logging
-from typing import List, Dict
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 from urllib.parse import quote_plus
 
 from bs4 import BeautifulSoup
-from api.http_client import get_http_client
-from api.utils import _normalize_text, _similar
+from api.http_client import upstream_get
+from api.utils import TitleMatcher
+from api.cache import cached
+from api.parsing import run_parser
+from api.concurrency import first_success, iter_bounded
 
 try:
     import lxml  # noqa: F401
@@ -15,6 +23,25 @@ except ImportError:
     _BS_PARSER = "html.parser"
 
 BASE_URL = "https://www.greenmangaming.com"
+GMG_CACHE_TTL = 15 * 60
+# Páginas de producto de la búsqueda que se piden a la vez
+GMG_FETCH_CONCURRENCY = 4
+# Formas de URL directa (GMG usa slugs), en orden de preferencia
+SLUG_PATTERNS = [
+    "/es/games/{slug}-pc/",
+    "/games/{slug}-pc/",
+    "/es/games/{slug}/",
+    "/games/{slug}/",
+    "/games/pc/{slug}/",
+    "/es/games/pc/{slug}/",
+]
+SLUG_CACHE_PATH = Path(os.environ.get("GMG_SLUG_CACHE_PATH", Path(__file__).resolve().parent.parent / "data" / "gmg_slugs.json"))
+# Un slug sin página directa (404 en todos los patrones) no se vuelve a probar durante este tiempo
+SLUG_MISS_TTL = 24 * 60 * 60
+# Los patrones aprendidos se olvidan pasado este tiempo (se vuelven a descubrir si siguen valiendo)
+SLUG_HIT_TTL = 30 * 24 * 60 * 60
+# Los cambios del caché de slugs se escriben a disco juntos, como mucho uno cada tantos segundos
+SLUG_SAVE_DELAY = 5.0
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
@@ -23,11 +50,10 @@ HEADERS = {
 logger = logging.getLogger(__name__)
 
 
-
-
-async def _extract_from_page_text(text: str) -> Dict:
+def _extract_from_page_text(text: str, parser: str = _BS_PARSER) -> Dict:
+    """Precio, nombre e imagen de una página de producto de GMG ({} si no hay precio)."""
     try:
-        soup = BeautifulSoup(text, _BS_PARSER)
+        soup = BeautifulSoup(text, parser)
 
         def _parse_price_text(t: str):
             if not t:
@@ -93,70 +119,204 @@ async def _extract_from_page_text(text: str) -> Dict:
         return {}
 
 
-async def gmg_search(q: str, limit: int = 3) -> List[Dict]:
-    client = await get_http_client()
+def _parse_search_links(text: str, max_items: int, parser: str = _BS_PARSER) -> List[str]:
+    """URLs de producto de la página de búsqueda de GMG (entre los primeros `max_items` enlaces)."""
+    soup = BeautifulSoup(text, parser)
+    items = (
+        soup.select("a.product-item")
+        or soup.select("a[href*='/games/']")
+        or soup.select("[class*='product'] a[href*='/games/']")
+        or []
+    )
+    links = []
+    for a in items[:max_items]:
+        href = a.get("href")
+        if not href or "/games/" not in href:
+            continue
+        links.append(href if href.startswith("http") else BASE_URL + href)
+    return links
+
+
+class SlugCache:
+    """Recuerda, en un JSON en disco, qué patrón de URL resolvió cada slug de GMG
+    (o que ninguno existe: entradas negativas con caducidad) para no volver a probarlos todos.
+
+    Los cambios se escriben agrupados (como mucho uno cada `save_delay` segundos) y las entradas
+    caducadas se descartan al cargar y al guardar.
+    """
+
+    def __init__(self, path: Path, miss_ttl: float = SLUG_MISS_TTL, hit_ttl: float = SLUG_HIT_TTL,
+                 save_delay: float = SLUG_SAVE_DELAY):
+        self.path = Path(path)
+        self.miss_ttl = miss_ttl
+        self.hit_ttl = hit_ttl
+        self.save_delay = save_delay
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._save_task: Optional[asyncio.Task] = None
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        ttl = self.miss_ttl if entry.get("miss") else self.hit_ttl
+        return now - entry.get("ts", 0) >= ttl
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._entries = {slug: e for slug, e in self._entries.items() if not self._expired(e, now)}
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._entries = {}
+            self._prune()
+        return self._entries
+
+    def _get(self, slug: str) -> Optional[Dict]:
+        entry = self._load().get(slug)
+        return entry if entry and not self._expired(entry, time.time()) else None
+
+    def pattern(self, slug: str) -> Optional[int]:
+        entry = self._get(slug)
+        return entry.get("pattern") if entry else None
+
+    def is_miss(self, slug: str) -> bool:
+        entry = self._get(slug)
+        return bool(entry and entry.get("miss"))
+
+    async def flush(self) -> None:
+        """Escribe ya los cambios pendientes (p. ej. al apagar)."""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+            self._save_task = None
+            await self._save()
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None
+        await self._save()
+
+    def _changed(self) -> None:
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.ensure_future(self._save_later())
+
+    async def _save(self) -> None:
+        self._load()
+        self._prune()
+        data = json.dumps(self._entries, ensure_ascii=False)
+
+        def _write():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Temporal con nombre único en el mismo directorio: dos escrituras nunca comparten archivo
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.path.parent,
+                                             prefix=self.path.name, suffix=".tmp", delete=False) as tmp:
+                tmp.write(data)
+            try:
+                os.replace(tmp.name, self.path)
+            except OSError:
+                os.unlink(tmp.name)
+                raise
 
+        try:
+            await asyncio.to_thread(_write)
+        except OSError as e:
+            logger.debug("GMG slug cache not saved: %s", e)
+
+    def remember(self, slug: str, pattern: int) -> None:
+        self._load()[slug] = {"pattern": pattern, "ts": time.time()}
+        self._changed()
+
+    def remember_miss(self, slug: str) -> None:
+        self._load()[slug] = {"miss": True, "ts": time.time()}
+        self._changed()
+
+    def forget(self, slug: str) -> None:
+        if self._load().pop(slug, None) is not None:
+            self._changed()
+
+
+slug_cache = SlugCache(SLUG_CACHE_PATH)
+
+
+def _slug_for(q: str) -> str:
     slug = re.sub(r"[^\w\s]", "", (q or "").lower()).strip()
     slug = re.sub(r"\s+", "-", slug).strip("-")
     if not slug:
         slug = q[:30].replace(" ", "-")
+    return slug
+
+
+async def _fetch_product(url: str) -> Tuple[int, Dict]:
+    """(status HTTP, info) de una página de producto; info vacío si no hay precio."""
+    r = await upstream_get("greenmangaming", url, headers=HEADERS)
+    if 200 <= r.status_code < 400:
+        info = await run_parser(_extract_from_page_text, r.text)
+        if info and info.get("precio") is not None:
+            info["tienda"] = "GreenManGaming"
+            info["url"] = url
+            return r.status_code, info
+    return r.status_code, {}
 
-    # Varias formas de URL directa (GMG usa slugs)
-    candidate_urls = [
-        f"{BASE_URL}/es/games/{slug}-pc/",
-        f"{BASE_URL}/games/{slug}-pc/",
-        f"{BASE_URL}/es/games/{slug}/",
-        f"{BASE_URL}/games/{slug}/",
-        f"{BASE_URL}/games/pc/{slug}/",
-        f"{BASE_URL}/es/games/pc/{slug}/",
-    ]
-
-    for url in candidate_urls:
+
+async def _probe_slug(slug: str) -> Optional[Dict]:
+    """Página directa del juego a partir del slug, usando (y aprendiendo) slug_cache."""
+    known = slug_cache.pattern(slug)
+    if known is not None and 0 <= known < len(SLUG_PATTERNS):
         try:
-            r = await client.get(url, headers=HEADERS, timeout=15.0)
-            if 200 <= r.status_code < 400:
-                info = await _extract_from_page_text(r.text)
-                if info and info.get("precio") is not None:
-                    info["tienda"] = "GreenManGaming"
-                    info["url"] = url
-                    return [info]
+            _, info = await _fetch_product(BASE_URL + SLUG_PATTERNS[known].format(slug=slug))
+            if info:
+                return info
         except Exception as e:
-            logger.debug("GMG direct fetch failed for %s: %s", url, e)
+            logger.debug("GMG cached slug fetch failed for %s: %s", slug, e)
+        slug_cache.forget(slug)
+    elif slug_cache.is_miss(slug):
+        return None
 
-    # Fallback: búsqueda por query
-    try:
-        search_url = f"{BASE_URL}/es/search/?query={quote_plus(q)}"
-        r = await client.get(search_url, headers=HEADERS, timeout=15.0)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, _BS_PARSER)
-        items = (
-            soup.select("a.product-item")
-            or soup.select("a[href*='/games/']")
-            or soup.select("[class*='product'] a[href*='/games/']")
-            or []
-        )
-        q_norm = _normalize_text(q)
-        results = []
-        for a in items[: limit + 5]:
+    # Todas las formas de URL directa a la vez; gana la primera con precio
+    urls = [BASE_URL + pattern.format(slug=slug) for pattern in SLUG_PATTERNS]
+    winner, outcomes = await first_success(
+        [lambda url=url: _fetch_product(url) for url in urls],
+        accept=lambda outcome: bool(outcome[1]),
+    )
+    if winner is not None:
+        slug_cache.remember(slug, winner)
+        return outcomes[winner][1]
+    for url, outcome in zip(urls, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.debug("GMG direct fetch failed for %s: %s", url, outcome)
+    # Solo se recuerda el fallo si GMG contestó 404 en todas (no por timeouts o errores de red)
+    if all(isinstance(o, tuple) and o[0] in (404, 410) for o in outcomes):
+        slug_cache.remember_miss(slug)
+    return None
+
+
+@cached("greenmangaming", ttl=GMG_CACHE_TTL)
+async def gmg_search(q: str, limit: int = 3) -> List[Dict]:
+    info = await _probe_slug(_slug_for(q))
+    if info:
+        return [info]
+
+    # Fallback: búsqueda por query (si falla, el error se propaga y la caché no lo guarda)
+    search_url = f"{BASE_URL}/es/search/?query={quote_plus(q)}"
+    r = await upstream_get("greenmangaming", search_url, headers=HEADERS)
+    r.raise_for_status()
+    links = await run_parser(_parse_search_links, r.text, limit + 5)
+
+    # Páginas de producto en paralelo (acotado), procesadas en el orden de la búsqueda; con
+    # `limit` resultados se cancelan las que falten
+    matcher = TitleMatcher(q, min_word_ratio=None)
+    results = []
+    errors = []
+    async for outcome in iter_bounded(_fetch_product, links, GMG_FETCH_CONCURRENCY):
+        if isinstance(outcome, BaseException):
+            errors.append(outcome)
+            continue
+        info = outcome[1]
+        name = info.get("nombre", "") if info else ""
+        if name and matcher.matches(name):
+            results.append(info)
             if len(results) >= limit:
                 break
-            href = a.get("href")
-            if not href or "/games/" not in href:
-                continue
-            full = href if href.startswith("http") else BASE_URL + href
-            try:
-                rr = await client.get(full, headers=HEADERS, timeout=15.0)
-                if 200 <= rr.status_code < 400:
-                    info = await _extract_from_page_text(rr.text)
-                    if info and info.get("precio") is not None:
-                        name = info.get("nombre", "")
-                        if name and (_similar(q_norm, _normalize_text(name)) >= 0.3 or q_norm in _normalize_text(name)):
-                            info["tienda"] = "GreenManGaming"
-                            info["url"] = full
-                            results.append(info)
-            except Exception:
-                continue
-        return results
-    except Exception as e:
-        logger.debug("GMG search fetch failed: %s", e)
-        return []
+    # Sin resultados porque fallaron todas las páginas de producto: error, no "no está en GMG"
+    if not results and links and len(errors) == len(links):
+        raise errors[0]
+    return results
@@ -1,7 +1,34 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
 import httpx
-from typing import Optional
 
-_http_client: Optional[httpx.AsyncClient] = None
+from api import deadline, metrics, tracing
+from api.breaker import CircuitOpenError, get_breaker
+from api.concurrency import RateLimiter
+from api.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx solo negocia HTTP/2 si está instalado: pip install httpx[http2])
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+# HTTP/2 multiplexa las peticiones concurrentes a una tienda sobre una sola conexión TLS
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "1").strip().lower() not in ("0", "false", "no") and _H2_AVAILABLE
+# Abrir conexiones a cada tienda al arrancar (DNS + TCP + TLS) para que la primera búsqueda no lo pague
+HTTP_PREWARM = os.environ.get("HTTP_PREWARM", "1").strip().lower() not in ("0", "false", "no")
+# Opcional (desactivado por defecto): volver a abrir las conexiones de una tienda sin tráfico antes
+# de que caduquen (keepalive_expiry), a costa de un HEAD periódico a cada tienda mientras no haya uso
+HTTP_KEEP_WARM = os.environ.get("HTTP_KEEP_WARM", "0").strip().lower() in ("1", "true", "yes")
+PREWARM_TIMEOUT = 5.0
 
 # User-Agent tipo navegador para reducir bloqueos por parte de las tiendas
 DEFAULT_HEADERS = {
@@ -9,21 +36,225 @@ DEFAULT_HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
 }
+DEFAULT_TIMEOUT = 15.0
+
+# Pool por upstream: conexiones máximas, conexiones ociosas que se conservan, cuánto viven
+# ociosas (segundos), orígenes a precalentar y peticiones/s permitidas al tráfico en segundo plano
+# (api/prewarm.py). Steam recibe ráfagas de appdetails, de ahí su pool mayor.
+# Precalentar es un HEAD a `warm`: solo abre conexión con ese host (store.steampowered.com sí;
+# api.steampowered.com, usado por el catálogo, o los CDN de imágenes no).
+UPSTREAMS: Dict[str, dict] = {
+    "steam": {
+        "max_connections": 20,
+        "max_keepalive": 10,
+        "keepalive_expiry": 60.0,
+        "warm": ("https://store.steampowered.com/",),
+        "background_rps": 4.0,
+    },
+    "cheapshark": {
+        "max_connections": 10,
+        "max_keepalive": 5,
+        "keepalive_expiry": 30.0,
+        "warm": ("https://www.cheapshark.com/",),
+        "background_rps": 2.0,
+    },
+    "nuuvem": {
+        "max_connections": 10,
+        "max_keepalive": 5,
+        "keepalive_expiry": 30.0,
+        "warm": ("https://www.nuuvem.com/",),
+        "background_rps": 1.0,
+    },
+    "greenmangaming": {
+        "max_connections": 12,
+        "max_keepalive": 6,
+        "keepalive_expiry": 30.0,
+        "warm": ("https://www.greenmangaming.com/",),
+        "background_rps": 1.0,
+    },
+    "instantgaming": {
+        "max_connections": 6,
+        "max_keepalive": 4,
+        "keepalive_expiry": 30.0,
+        "warm": ("https://www.instant-gaming.com/",),
+        "background_rps": 0.5,
+    },
+    # Resto de llamadas (catálogo de Steam, etc.)
+    "default": {
+        "max_connections": 10,
+        "max_keepalive": 5,
+        "keepalive_expiry": 30.0,
+        "warm": (),
+        "background_rps": 2.0,
+    },
+}
+
+upstream_rejected = metrics.register(metrics.Counter(
+    "gph_upstream_rejected_total", "Llamadas a tiendas que no se hicieron (circuito abierto o sin presupuesto)", ("upstream", "reason")))
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+# Última vez (monotonic) que se usó la conexión de cada upstream, para saber cuáles mantener calientes
+_last_used: Dict[str, float] = {}
+_background_limiters: Dict[str, RateLimiter] = {}
+# True en tareas en segundo plano (precalentado): sus llamadas pasan por el rate limit de cada tienda
+_background: contextvars.ContextVar[bool] = contextvars.ContextVar("gph_background_traffic", default=False)
+# Transporte alternativo para todos los clientes (benchmarks / pruebas sin red)
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    cfg = UPSTREAMS.get(upstream, UPSTREAMS["default"])
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+        headers=DEFAULT_HEADERS,
+        follow_redirects=True,
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_keepalive"],
+            keepalive_expiry=cfg["keepalive_expiry"],
+        ),
+        transport=_transport,
+    )
+
+
+async def get_http_client(upstream: str = "default") -> httpx.AsyncClient:
+    """Cliente compartido para `upstream` (clave de UPSTREAMS); se crea la primera vez."""
+    if upstream not in UPSTREAMS:
+        upstream = "default"
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = _clients[upstream] = _build_client(upstream)
+    return client
+
+
+@contextmanager
+def background_traffic() -> Iterator[None]:
+    """Marca las llamadas a tiendas hechas dentro del bloque como tráfico en segundo plano."""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+def _background_limiter(upstream: str) -> RateLimiter:
+    limiter = _background_limiters.get(upstream)
+    if limiter is None:
+        rate = UPSTREAMS.get(upstream, UPSTREAMS["default"])["background_rps"]
+        limiter = _background_limiters[upstream] = RateLimiter(rate)
+    return limiter
+
+
+async def upstream_get(upstream: str, url: str, **kwargs) -> httpx.Response:
+    """GET a una tienda a través de su circuit breaker y dentro del presupuesto de la petición.
+
+    Si no se pasa `timeout` se usa el adaptativo del breaker, recortado a lo que le quede a la
+    petición; sin presupuesto restante lanza DeadlineExceeded sin hacer la petición. Cuentan
+    como fallo los errores de red/timeouts, los 5xx y los 429; un 404 es una respuesta válida.
+    Si el circuito está abierto lanza CircuitOpenError. El tráfico en segundo plano
+    (`background_traffic`) espera antes su turno en el rate limit de la tienda.
+    """
+    if _background.get():
+        await _background_limiter(upstream).acquire()
+    rem = deadline.remaining()
+    if rem is not None and rem <= 0:
+        deadline.mark_exhausted()
+        upstream_rejected.inc(upstream, "deadline")
+        raise DeadlineExceeded(f"request budget exhausted before calling {upstream}")
+    breaker = get_breaker(upstream)
+    try:
+        probe = breaker.before_call()
+    except CircuitOpenError:
+        upstream_rejected.inc(upstream, "circuit_open")
+        raise
+    timeout = kwargs.pop("timeout", None) or breaker.timeout()
+    # Si manda el presupuesto y no la tienda, agotarlo no es culpa de la tienda
+    budget_bound = rem is not None and rem < timeout
+    client = await get_http_client(upstream)
+    host = httpx.URL(url).host
+    start = time.monotonic()
+    status = "error"
+    with tracing.span(f"upstream.{upstream}", url=url) as sp:
+        try:
+            if budget_bound:
+                resp = await asyncio.wait_for(client.get(url, timeout=rem, **kwargs), rem)
+            else:
+                resp = await client.get(url, timeout=timeout, **kwargs)
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            status = "timeout"
+            if not budget_bound:
+                breaker.record(False, time.monotonic() - start, probe)
+                raise
+            breaker.release(probe)
+            deadline.mark_exhausted()
+            raise DeadlineExceeded(f"request budget exhausted waiting for {upstream}") from e
+        except httpx.TransportError:
+            breaker.record(False, time.monotonic() - start, probe)
+            raise
+        except BaseException:
+            # Cancelada (hedging / first_success) u otro error propio: no dice nada de la tienda
+            status = "cancelled"
+            breaker.release(probe)
+            raise
+        else:
+            status = str(resp.status_code)
+        finally:
+            sp["status"] = status
+            metrics.upstream_request_duration.observe(time.monotonic() - start, upstream, host, status)
+    _last_used[upstream] = time.monotonic()
+    ok = resp.status_code < 500 and resp.status_code != 429
+    breaker.record(ok, time.monotonic() - start, probe)
+    return resp
+
+
+def set_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Hace que los clientes creados a partir de ahora usen `transport` (p. ej. httpx.MockTransport)."""
+    global _transport
+    _transport = transport
+
+
+async def _warm(upstream: str, url: str) -> None:
+    client = await get_http_client(upstream)
+    try:
+        # Cualquier respuesta sirve: lo que interesa es dejar la conexión abierta en el pool
+        await client.head(url, timeout=PREWARM_TIMEOUT)
+        _last_used[upstream] = time.monotonic()
+    except Exception as e:
+        logger.debug("Prewarm of %s failed: %s", url, e)
+
+
+async def open_http_clients() -> None:
+    """Crea los clientes de todas las tiendas y, si HTTP_PREWARM, abre ya sus conexiones."""
+    for upstream in UPSTREAMS:
+        await get_http_client(upstream)
+    if HTTP_PREWARM and _transport is None:
+        await asyncio.gather(*(_warm(u, url) for u, cfg in UPSTREAMS.items() for url in cfg["warm"]))
 
 
-async def get_http_client() -> httpx.AsyncClient:
-    global _http_client
-    if _http_client is None:
-        _http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(15.0),
-            headers=DEFAULT_HEADERS,
-            follow_redirects=True,
-        )
-    return _http_client
+async def keep_warm() -> None:
+    """Bucle para el lifespan: vuelve a calentar los orígenes de `warm` de cada tienda que, sin
+    tráfico, perdería su conexión antes de la siguiente vuelta. Con tráfico real no hace nada."""
+    if not (HTTP_PREWARM and HTTP_KEEP_WARM) or _transport is not None:
+        return
+    warmed = {u: cfg for u, cfg in UPSTREAMS.items() if cfg["warm"]}
+    if not warmed:
+        return
+    # Vueltas frecuentes para recalentar cada tienda poco antes de que caduque (un HEAD cada
+    # ~keepalive_expiry por tienda sin tráfico), con una vuelta de margen
+    interval = min(cfg["keepalive_expiry"] for cfg in warmed.values()) / 6
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        idle = [
+            (u, url) for u, cfg in warmed.items() for url in cfg["warm"]
+            if now - _last_used.get(u, 0.0) + 2 * interval >= cfg["keepalive_expiry"]
+        ]
+        await asyncio.gather(*(_warm(u, url) for u, url in idle))
 
 
 async def close_http_client() -> None:
-    global _http_client
-    if _http_client is not None:
-        await _http_client.aclose()
-        _http_client = None
\ No newline at end of file
+    """Cierra todos los clientes (fin del lifespan)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
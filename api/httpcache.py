@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from api.deadline import PARTIAL_HEADER
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_ENABLED = os.environ.get("HTTP_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+# Ruta -> (max-age, stale-while-revalidate) en segundos. Más cortos que los TTL de api/cache.py
+# para que navegador/CDN y la caché del servidor no se sumen en un precio demasiado viejo.
+CACHE_POLICIES: Dict[str, Tuple[int, int]] = {
+    "/search": (60, 300),
+    "/preview": (60, 300),
+    "/nuuvem": (120, 600),
+    "/fanatical": (120, 600),
+    "/greenmangaming": (120, 600),
+    "/instantgaming": (120, 600),
+    "/compare": (60, 300),
+    "/autocomplete": (300, 3600),
+    "/history": (60, 600),
+}
+# Rutas con Cache-Control pero sin ETag: su cuerpo lleva tiempos (elapsed_ms) y no se repite
+# nunca byte a byte, así que un ETag no daría 304 y solo obligaría a acumular el cuerpo
+NO_ETAG = frozenset({"/compare"})
+# Respuestas parciales (presupuesto agotado o errores tragados de alguna tienda): que nadie las guarde
+NO_STORE = b"no-store"
+
+
+def cache_control(max_age: int, stale_while_revalidate: int) -> bytes:
+    return f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}".encode("latin-1")
+
+
+def compute_etag(body: bytes) -> bytes:
+    """ETag fuerte: hash del JSON serializado (mismo cuerpo byte a byte = mismo ETag)."""
+    return b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode("ascii") + b'"'
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """If-None-Match usa comparación débil: `W/"x"` coincide con `"x"`."""
+    if if_none_match.strip() == b"*":
+        return True
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate.startswith(b"W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+_ENCODED_POLICIES = {path: cache_control(*policy) for path, policy in CACHE_POLICIES.items()}
+# Un 304 no lleva cuerpo: fuera las cabeceras que lo describen
+_BODY_HEADERS = {b"content-length", b"content-type"}
+
+
+class HttpCacheMiddleware:
+    """ASGI: Cache-Control por endpoint, ETag fuerte y 304 para `If-None-Match`.
+
+    Solo actúa sobre GET a rutas de CACHE_POLICIES con respuesta 200 en JSON que no traiga
+    ya su propio Cache-Control; el resto (streaming de /compare/stream, errores, debug) pasa tal cual.
+    Las rutas de NO_ETAG reciben solo el Cache-Control, sin acumular el cuerpo.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not HTTP_CACHE_ENABLED or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"].rstrip("/") or "/"
+        policy = _ENCODED_POLICIES.get(path)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        with_etag = path not in NO_ETAG
+
+        if_none_match: Optional[bytes] = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value
+                break
+
+        start: Optional[dict] = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                names = {name.lower() for name, _ in headers}
+                content_type = next((v for n, v in headers if n.lower() == b"content-type"), b"")
+                if message["status"] != 200 or b"cache-control" in names or not content_type.startswith(b"application/json"):
+                    await send(message)
+                    return
+                if PARTIAL_HEADER in names or not with_etag:
+                    message["headers"] = list(headers) + [(b"cache-control", NO_STORE if PARTIAL_HEADER in names else policy)]
+                    await send(message)
+                    return
+                # Hay que tener el cuerpo entero para calcular el ETag
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            etag = compute_etag(body)
+            headers = list(start.get("headers", [])) + [(b"cache-control", policy), (b"etag", etag)]
+            if if_none_match is not None and etag_matches(if_none_match, etag):
+                headers = [(n, v) for n, v in headers if n.lower() not in _BODY_HEADERS]
+                await send({"type": "http.response.start", "status": 304, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,13 +1,23 @@
+import asyncio
 import os
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from api.routes import router
+from api.catalog import steam_catalog
+from api.parsing import shutdown_parse_executor
+from api.http_client import open_http_clients, close_http_client, keep_warm
+from api.deadline import DeadlineMiddleware
+from api.metrics import MetricsMiddleware
+from api.tracing import TracingMiddleware
+from api.httpcache import HttpCacheMiddleware
+from api.pricestore import price_store
+from api.greenmangaming import slug_cache
+from api.prewarm import PREWARM_ENABLED, PopularityMiddleware, prewarm_scheduler
 
 # Carpeta api (donde está main.py); los estáticos están en api/static
 BASE_DIR = Path(__file__).resolve().parent
@@ -36,40 +46,97 @@ _CORS_HEADERS = {
 }
 
 
-class CorsMiddleware(BaseHTTPMiddleware):
-    """Añade CORS a todas las respuestas para que el front en Vercel pueda llamar al API."""
-
-    async def dispatch(self, request: Request, call_next) -> Response:
-        origin = request.headers.get("origin", "").strip()
-        if _ALLOWED_ORIGINS == {"*"}:
-            allow_origin = "*"
-            cors_headers = {**_CORS_HEADERS, "Access-Control-Allow-Origin": "*"}
-        elif origin and origin in _ALLOWED_ORIGINS:
-            allow_origin = origin
-            cors_headers = {
-                **_CORS_HEADERS,
-                "Access-Control-Allow-Origin": allow_origin,
-                "Access-Control-Allow-Credentials": "true",
-            }
-        else:
-            allow_origin = next(iter(_ALLOWED_ORIGINS), "")
-            cors_headers = {
-                **_CORS_HEADERS,
-                "Access-Control-Allow-Origin": allow_origin,
-                "Access-Control-Allow-Credentials": "true",
-            }
-
-        if request.method == "OPTIONS":
-            return Response(status_code=200, headers=cors_headers)
-
-        response = await call_next(request)
-        for key, value in cors_headers.items():
-            response.headers[key] = value
-        return response
-
-
-app = FastAPI(title="Steam Price Search API")
+def _cors_header_list(allow_origin: str, credentials: bool) -> List[Tuple[bytes, bytes]]:
+    headers = {**_CORS_HEADERS, "Access-Control-Allow-Origin": allow_origin}
+    if credentials:
+        headers["Access-Control-Allow-Credentials"] = "true"
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
 
+
+# Cabeceras ya codificadas por origen, calculadas una sola vez al arrancar
+if _ALLOWED_ORIGINS == {"*"}:
+    _CORS_BY_ORIGIN: Dict[str, List[Tuple[bytes, bytes]]] = {}
+    _CORS_DEFAULT = _cors_header_list("*", credentials=False)
+else:
+    _CORS_BY_ORIGIN = {o: _cors_header_list(o, credentials=True) for o in _ALLOWED_ORIGINS}
+    _CORS_DEFAULT = _cors_header_list(next(iter(_ALLOWED_ORIGINS), ""), credentials=True)
+_CORS_NAMES = {name for name, _ in _CORS_DEFAULT}
+# Allow-Origin depende del Origin de la petición: las cachés (CDN) tienen que separarlas
+_CORS_VARY = [(b"vary", b"Origin")] if _CORS_BY_ORIGIN else []
+
+
+class CorsMiddleware:
+    """Añade CORS a todas las respuestas para que el front en Vercel pueda llamar al API.
+
+    ASGI puro: responde los OPTIONS sin pasar por el router y solo toca el mensaje
+    http.response.start, así que los cuerpos en streaming pasan tal cual.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = _CORS_DEFAULT
+        if _CORS_BY_ORIGIN:
+            for name, value in scope["headers"]:
+                if name == b"origin":
+                    cors_headers = _CORS_BY_ORIGIN.get(value.decode("latin-1").strip(), _CORS_DEFAULT)
+                    break
+
+        if scope["method"] == "OPTIONS":
+            await send({"type": "http.response.start", "status": 200, "headers": cors_headers + [(b"content-length", b"0")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = [h for h in message.get("headers", []) if h[0].lower() not in _CORS_NAMES]
+                message["headers"] = headers + cors_headers + _CORS_VARY
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pools por tienda abiertos (y conexiones precalentadas) antes de aceptar peticiones
+    await open_http_clients()
+    # ...y se mantienen abiertas mientras la tienda no recibe tráfico
+    keep_warm_task = asyncio.create_task(keep_warm())
+    # Historial de precios en SQLite (data/prices.sqlite3)
+    await price_store.open()
+    # El catálogo de Steam (para /autocomplete) se carga en segundo plano: el arranque no espera
+    catalog_task = asyncio.create_task(steam_catalog.run())
+    # Refresco periódico de las búsquedas más populares para que lleguen a datos ya calientes
+    prewarm_task = asyncio.create_task(prewarm_scheduler.run()) if PREWARM_ENABLED else None
+    yield
+    keep_warm_task.cancel()
+    catalog_task.cancel()
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    await close_http_client()
+    await price_store.close()
+    # Slugs de GMG aprendidos que aún no se habían escrito a disco
+    await slug_cache.flush()
+    shutdown_parse_executor()
+
+
+app = FastAPI(title="Steam Price Search API", lifespan=lifespan)
+
+# Popularidad de cada búsqueda (la usa el precalentado de api/prewarm.py)
+app.add_middleware(PopularityMiddleware)
+# Presupuesto de tiempo por petición (?budget= / X-Request-Budget) para todas las tiendas
+app.add_middleware(DeadlineMiddleware)
+# Cache-Control / ETag / 304 por endpoint (por fuera del presupuesto para ver X-Partial-Results)
+app.add_middleware(HttpCacheMiddleware)
+# Peticiones en curso y latencia por ruta para /metrics
+app.add_middleware(MetricsMiddleware)
+# Server-Timing / X-Request-Id y trazas para /debug/traces
+app.add_middleware(TracingMiddleware)
 # Middleware CORS como primera capa para que todas las respuestas lleven los headers
 app.add_middleware(CorsMiddleware)
 
@@ -0,0 +1,160 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Métricas en memoria y en formato de texto de Prometheus, sin dependencias.
+# Todo se actualiza desde el event loop (un solo hilo), así que no hacen falta locks.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge con valor propio (inc/dec) o calculado al exportar (`collect`)."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), collect: Callable[[], Dict[Tuple, float]] = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def render(self) -> List[str]:
+        values = self.collect() if self.collect else self._values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    """Histograma con buckets fijos: observar es un bisect y un incremento."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [conteo por bucket (+Inf al final), suma, total]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+_registry: List = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests_in_flight = register(Gauge("gph_http_requests_in_flight", "Peticiones HTTP en curso"))
+http_request_duration = register(Histogram(
+    "gph_http_request_duration_seconds", "Duración de las peticiones al API por ruta", ("route", "method", "status")))
+upstream_request_duration = register(Histogram(
+    "gph_upstream_request_duration_seconds", "Latencia de las llamadas a cada tienda", ("upstream", "host", "status")))
+parse_duration = register(Histogram(
+    "gph_parse_duration_seconds", "Tiempo de parseo de HTML por tienda (incluye la espera en el pool)", ("store", "parser"), PARSE_BUCKETS))
+store_duration = register(Histogram(
+    "gph_store_duration_seconds", "Duración de cada tienda (adaptador + conversión)", ("store", "outcome")))
+store_results = register(Histogram(
+    "gph_store_results", "Resultados devueltos por cada tienda", ("store",), COUNT_BUCKETS))
+cache_requests = register(Counter("gph_cache_requests_total", "Consultas a la caché de respuestas", ("store", "result")))
+cache_evictions = register(Counter("gph_cache_evictions_total", "Entradas expulsadas por LRU"))
+
+
+class MetricsMiddleware:
+    """ASGI: peticiones en curso y duración por plantilla de ruta (no por URL, para acotar
+    la cardinalidad)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, path, scope["method"], str(status[0]))
@@ -0,0 +1,55 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from api import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+# Dónde se parsea el HTML de las tiendas:
+#   thread  -> pool de hilos (por defecto; libera el event loop)
+#   process -> pool de procesos (usa varios núcleos; los extractores deben ser funciones puras)
+#   inline  -> en el propio event loop (como antes; útil para depurar)
+PARSE_EXECUTOR = os.environ.get("PARSE_EXECUTOR", "thread").strip().lower()
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[Executor] = None
+
+
+def get_parse_executor() -> Optional[Executor]:
+    global _executor
+    if _executor is None and PARSE_EXECUTOR != "inline":
+        if PARSE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="parse")
+    return _executor
+
+
+async def run_parser(fn: Callable[..., R], *args, **kwargs) -> R:
+    """Ejecuta un extractor puro (html -> dict/list) fuera del event loop."""
+    executor = get_parse_executor()
+    # Tienda = módulo del extractor (api.nuuvem -> nuuvem)
+    store = fn.__module__.rsplit(".", 1)[-1]
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"parse.{store}", parser=fn.__name__):
+            if executor is None:
+                return fn(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    finally:
+        metrics.parse_duration.observe(time.perf_counter() - start, store, fn.__name__)
+
+
+def shutdown_parse_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from api import cache, metrics
+from api.concurrency import gather_bounded
+from api.http_client import background_traffic
+from api.routes import search_prices
+from api.stores import STORES
+from api.utils import _normalize_text
+
+logger = logging.getLogger(__name__)
+
+PREWARM_ENABLED = os.environ.get("PREWARM_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+# Cada cuánto (segundos) se refrescan las búsquedas populares; por debajo de los TTL de caché (10 min)
+# para que no lleguen a caducar
+PREWARM_INTERVAL = float(os.environ.get("PREWARM_INTERVAL", "300"))
+# Cuántas búsquedas (tienda/ruta + query + país + limit) se refrescan en cada ronda
+PREWARM_TOP_K = int(os.environ.get("PREWARM_TOP_K", "20"))
+# Popularidad mínima (peticiones recientes, ya con el decaimiento) para merecer el refresco:
+# con 1.5, al menos dos peticiones en la última media vida
+PREWARM_MIN_SCORE = float(os.environ.get("PREWARM_MIN_SCORE", "1.5"))
+# Refrescos simultáneos como mucho (además, cada tienda tiene su rate limit en http_client.UPSTREAMS)
+PREWARM_CONCURRENCY = int(os.environ.get("PREWARM_CONCURRENCY", "3"))
+# La popularidad de una búsqueda se reduce a la mitad cada este tiempo sin peticiones
+PREWARM_HALF_LIFE = float(os.environ.get("PREWARM_HALF_LIFE", str(60 * 60)))
+PREWARM_MAX_TRACKED = 2000
+PREWARM_JOB_TIMEOUT = 90.0
+
+JobKey = Tuple[str, str, str, int]  # (job, query normalizada, cc, limit)
+
+# Ruta -> (jobs que la responden, limit por defecto de la ruta)
+_STORE_JOBS = tuple(STORES)
+ROUTE_JOBS: Dict[str, Tuple[Tuple[str, ...], int]] = {
+    "/search": (("search",), 5),
+    "/nuuvem": (("nuuvem",), 3),
+    "/fanatical": (("fanatical",), 3),
+    "/greenmangaming": (("greenmangaming",), 3),
+    "/instantgaming": (("instantgaming",), 3),
+    "/compare": (_STORE_JOBS, 3),
+    "/compare/stream": (_STORE_JOBS, 3),
+}
+# Job -> función(q, cc, limit) que hace lo mismo que la petición original
+JOBS: Dict[str, Callable[[str, str, int], Awaitable[list]]] = {"search": search_prices, **STORES}
+
+prewarm_jobs = metrics.register(metrics.Counter("gph_prewarm_jobs_total", "Búsquedas refrescadas en segundo plano", ("job", "outcome")))
+
+
+class QueryPopularity:
+    """Top-K de búsquedas con decaimiento exponencial.
+
+    Cada petición suma 1 al score de su clave y el score se reduce a la mitad cada `half_life`
+    segundos, así que cuenta más lo que se busca ahora que lo que se buscó ayer. Si hay más de
+    `max_tracked` claves se descartan las menos populares.
+    """
+
+    def __init__(self, half_life: float = PREWARM_HALF_LIFE, max_tracked: int = PREWARM_MAX_TRACKED):
+        self.decay = math.log(2) / half_life
+        self.max_tracked = max_tracked
+        # clave -> [score, actualizado (monotonic), query tal como llegó la última vez]
+        self._entries: Dict[JobKey, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _score(self, entry: list, now: float) -> float:
+        return entry[0] * math.exp(-self.decay * (now - entry[1]))
+
+    def hit(self, job: str, query: str, cc: str, limit: int, now: Optional[float] = None) -> None:
+        norm = _normalize_text(query)
+        if not norm:
+            return
+        now = time.monotonic() if now is None else now
+        key = (job, norm, cc.lower(), limit)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [1.0, now, query]
+            if len(self._entries) > self.max_tracked:
+                self._prune(now)
+        else:
+            entry[0] = self._score(entry, now) + 1.0
+            entry[1] = now
+            entry[2] = query
+
+    def _prune(self, now: float) -> None:
+        keep = heapq.nlargest(self.max_tracked // 2, self._entries.items(), key=lambda kv: self._score(kv[1], now))
+        self._entries = dict(keep)
+
+    def top(self, k: int, min_score: float = 0.0, now: Optional[float] = None) -> List[Tuple[JobKey, float, str]]:
+        """Las `k` claves más populares con score >= min_score: (clave, score, query original)."""
+        now = time.monotonic() if now is None else now
+        scored = ((key, self._score(entry, now), entry[2]) for key, entry in self._entries.items())
+        return heapq.nlargest(k, (s for s in scored if s[1] >= min_score), key=lambda s: s[1])
+
+
+class PopularityMiddleware:
+    """ASGI: cuenta en `popularity` cada búsqueda respondida con 200 en las rutas de ROUTE_JOBS."""
+
+    def __init__(self, app, popularity: Optional[QueryPopularity] = None):
+        self.app = app
+        self.popularity = popularity or popular_queries
+
+    async def __call__(self, scope, receive, send):
+        route = ROUTE_JOBS.get(scope["path"]) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 0
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        if status == 200:
+            params = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            jobs, default_limit = route
+            try:
+                limit = int(params.get("limit", [default_limit])[0])
+            except ValueError:
+                return
+            for job in jobs:
+                self.popularity.hit(job, params.get("q", [""])[0], params.get("cc", ["co"])[0], limit)
+
+
+class PrewarmScheduler:
+    """Refresca periódicamente las búsquedas más populares contra las tiendas.
+
+    Cada ronda toma el top-K de `popularity` y repite esas búsquedas por los mismos caminos que
+    una petición (adaptadores, caché, base de precios), pero saltándose lo guardado para traer
+    precios nuevos (cache.refreshing) y con el rate limit de segundo plano de cada tienda
+    (http_client.background_traffic). Como mucho `concurrency` búsquedas a la vez.
+    """
+
+    def __init__(self, popularity: QueryPopularity, jobs: Dict[str, Callable[[str, str, int], Awaitable[list]]] = JOBS,
+                 interval: float = PREWARM_INTERVAL, top_k: int = PREWARM_TOP_K, min_score: float = PREWARM_MIN_SCORE,
+                 concurrency: int = PREWARM_CONCURRENCY, job_timeout: float = PREWARM_JOB_TIMEOUT):
+        self.popularity = popularity
+        self.jobs = jobs
+        self.interval = interval
+        self.top_k = top_k
+        self.min_score = min_score
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        self.last_run: Optional[float] = None
+
+    async def _run_job(self, item: Tuple[JobKey, float, str]) -> bool:
+        (job, _, cc, limit), _, query = item
+        outcome = "error"
+        try:
+            with background_traffic(), cache.refreshing():
+                await asyncio.wait_for(self.jobs[job](query, cc, limit), self.job_timeout)
+            outcome = "ok"
+            return True
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except Exception as e:
+            logger.debug("Prewarm %s %r failed: %s", job, query, e)
+        finally:
+            prewarm_jobs.inc(job, outcome)
+        return False
+
+    async def refresh_once(self) -> int:
+        """Una ronda de refresco; devuelve cuántas búsquedas terminaron bien."""
+        top = [item for item in self.popularity.top(self.top_k, self.min_score) if item[0][0] in self.jobs]
+        if not top:
+            return 0
+        start = time.monotonic()
+        results = await gather_bounded(self._run_job, top, limit=self.concurrency)
+        ok = sum(1 for r in results if r is True)
+        self.last_run = time.time()
+        logger.info("Prewarm: %s/%s popular searches refreshed in %.1fs", ok, len(top), time.monotonic() - start)
+        return ok
+
+    async def run(self) -> None:
+        """Bucle para el lifespan: una ronda cada `interval` segundos hasta que se cancela."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.warning("Prewarm round failed: %s", e)
+
+
+popular_queries = QueryPopularity()
+prewarm_scheduler = PrewarmScheduler(popular_queries)
+
+metrics.register(metrics.Gauge("gph_prewarm_tracked_queries", "Búsquedas con popularidad registrada",
+                               collect=lambda: {(): len(popular_queries)}))
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from api.schemas import GamePrice, PricePoint
+from api.utils import _normalize_text
+from api import tracing
+
+logger = logging.getLogger(__name__)
+
+# Base SQLite con cada precio observado ("" = desactivada)
+PRICESTORE_PATH = os.environ.get("PRICESTORE_PATH", str(Path(__file__).resolve().parent.parent / "data" / "prices.sqlite3"))
+# Una búsqueda guardada hace menos de esto (segundos) se responde desde la base sin llamar a la tienda (0 = nunca)
+PRICESTORE_MAX_AGE = float(os.environ.get("PRICESTORE_MAX_AGE", "300"))
+# Mismo precio visto otra vez antes de este tiempo: no se añade otra observación (los aciertos de caché repiten datos)
+PRICESTORE_DEDUP_SECONDS = 10 * 60
+# Observaciones más viejas se borran al arrancar
+PRICESTORE_RETENTION_DAYS = float(os.environ.get("PRICESTORE_RETENTION_DAYS", "365"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    store TEXT NOT NULL,
+    cc TEXT NOT NULL,
+    appid INTEGER NOT NULL,
+    nombre TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    url TEXT NOT NULL,
+    precio_final REAL NOT NULL,
+    precio_original REAL,
+    porcentaje_descuento INTEGER NOT NULL,
+    moneda TEXT,
+    tiny_image TEXT NOT NULL,
+    observed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS obs_url ON observations (url, store, cc, observed_at);
+CREATE INDEX IF NOT EXISTS obs_name ON observations (name_norm, observed_at);
+CREATE INDEX IF NOT EXISTS obs_appid ON observations (appid, observed_at);
+CREATE INDEX IF NOT EXISTS obs_time ON observations (observed_at);
+CREATE TABLE IF NOT EXISTS searches (
+    source TEXT NOT NULL,
+    cc TEXT NOT NULL,
+    query TEXT NOT NULL,
+    requested INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    observation_ids TEXT NOT NULL,
+    PRIMARY KEY (source, cc, query)
+);
+"""
+
+_PRICE_COLUMNS = "appid, nombre, url, precio_final, precio_original, porcentaje_descuento, moneda, tiny_image"
+
+
+def _price_from_row(row: Sequence) -> GamePrice:
+    appid, nombre, url, final, original, discount, moneda, image = row
+    return GamePrice(appid=appid, nombre=nombre, precio_final=final, precio_original=original,
+                     porcentaje_descuento=discount, moneda=moneda, steam_url=url, tiny_image=image)
+
+
+class PriceStore:
+    """Historial de precios en SQLite (modo WAL) y respuestas recientes por búsqueda.
+
+    Cada hilo usa su propia conexión (las llamadas van por asyncio.to_thread); WAL deja leer
+    mientras otro hilo escribe. Los errores de SQLite se registran y se tratan como "sin datos".
+    """
+
+    def __init__(self, path: str = PRICESTORE_PATH, max_age: float = PRICESTORE_MAX_AGE,
+                 dedup_seconds: float = PRICESTORE_DEDUP_SECONDS, retention_days: float = PRICESTORE_RETENTION_DAYS):
+        self.path = Path(path) if path else None
+        self.max_age = max_age
+        self.dedup_seconds = dedup_seconds
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._ready = False
+        self._pending = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None and self._ready
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _open_sync(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            if self.retention_days > 0:
+                conn.execute("DELETE FROM observations WHERE observed_at < ?", (time.time() - self.retention_days * 86400,))
+
+    async def open(self) -> None:
+        if self.path is None:
+            return
+        try:
+            await asyncio.to_thread(self._open_sync)
+            self._ready = True
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Price store disabled (%s): %s", self.path, e)
+
+    async def close(self) -> None:
+        """Espera las escrituras pendientes y cierra las conexiones."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self._ready = False
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # --- escritura ---
+
+    def _record_sync(self, source: str, cc: str, query: str, limit: int, prices: List[GamePrice], stores: List[str], now: float) -> None:
+        conn = self._conn()
+        ids = []
+        with conn:
+            for price, store in zip(prices, stores):
+                values = (price.appid, price.nombre, price.steam_url, price.precio_final, price.precio_original,
+                          price.porcentaje_descuento, price.moneda, price.tiny_image)
+                last = conn.execute(
+                    f"SELECT id, {_PRICE_COLUMNS} FROM observations WHERE url = ? AND store = ? AND cc = ? AND observed_at >= ?"
+                    " ORDER BY observed_at DESC LIMIT 1",
+                    (price.steam_url, store, cc, now - self.dedup_seconds),
+                ).fetchone()
+                if last is not None and tuple(last[1:]) == values:
+                    ids.append(last[0])
+                    continue
+                cur = conn.execute(
+                    f"INSERT INTO observations (store, cc, name_norm, observed_at, {_PRICE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (store, cc, _normalize_text(price.nombre), now, *values),
+                )
+                ids.append(cur.lastrowid)
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (source, cc, query, requested, fetched_at, observation_ids) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, cc, _normalize_text(query), limit, now, json.dumps(ids)),
+            )
+
+    async def _record(self, *args) -> None:
+        try:
+            await asyncio.to_thread(self._record_sync, *args)
+        except sqlite3.Error as e:
+            logger.warning("Price store write failed: %s", e)
+
+    def record(self, source: str, cc: str, query: str, limit: int, prices: List[GamePrice], stores: Optional[List[str]] = None) -> None:
+        """Guarda en segundo plano los precios de una búsqueda (la respuesta no espera la escritura).
+
+        `source` identifica la búsqueda (tienda o ruta); `stores` la tienda de cada precio si no es `source`.
+        """
+        if not self.enabled or not prices:
+            return
+        task = asyncio.ensure_future(self._record(source, cc, query, limit, list(prices), stores or [source] * len(prices), time.time()))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    # --- lectura ---
+
+    def _fresh_sync(self, source: str, cc: str, query: str, limit: int, since: float) -> Optional[List[GamePrice]]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT requested, observation_ids FROM searches WHERE source = ? AND cc = ? AND query = ? AND fetched_at >= ?",
+            (source, cc, _normalize_text(query), since),
+        ).fetchone()
+        if row is None:
+            return None
+        requested, ids = row[0], json.loads(row[1])
+        # Se guardó pidiendo menos resultados de los que se piden ahora y se llenó: puede que falten
+        if requested < limit and len(ids) >= requested:
+            return None
+        ids = ids[:limit]
+        placeholders = ",".join("?" * len(ids))
+        rows = {r[0]: r[1:] for r in conn.execute(f"SELECT id, {_PRICE_COLUMNS} FROM observations WHERE id IN ({placeholders})", ids)}
+        if len(rows) < len(ids):
+            return None
+        return [_price_from_row(rows[i]) for i in ids]
+
+    async def fresh(self, source: str, cc: str, query: str, limit: int) -> Optional[List[GamePrice]]:
+        """Resultados de la misma búsqueda guardados hace menos de `max_age`, o None."""
+        if not self.enabled or self.max_age <= 0:
+            return None
+        try:
+            with tracing.span("pricestore.read", source=source):
+                return await asyncio.to_thread(self._fresh_sync, source, cc, query, limit, time.time() - self.max_age)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Price store read failed: %s", e)
+            return None
+
+    def _history_sync(self, where: str, params: tuple, since: float, until: float, limit: int) -> List[PricePoint]:
+        rows = self._conn().execute(
+            f"SELECT store, cc, observed_at, {_PRICE_COLUMNS} FROM observations WHERE {where} AND observed_at BETWEEN ? AND ?"
+            " ORDER BY observed_at DESC LIMIT ?",
+            (*params, since, until, limit),
+        ).fetchall()
+        # Si `limit` recorta, se quedan las observaciones más recientes; se devuelven en orden cronológico
+        rows.reverse()
+        return [
+            PricePoint(store=store, cc=cc, observed_at=observed_at, appid=appid, nombre=nombre, url=url, precio_final=final,
+                       precio_original=original, porcentaje_descuento=discount, moneda=moneda)
+            for store, cc, observed_at, appid, nombre, url, final, original, discount, moneda, _ in rows
+        ]
+
+    async def history(self, *, appid: Optional[int] = None, url: Optional[str] = None, name: Optional[str] = None,
+                      store: Optional[str] = None, cc: Optional[str] = None, since: float = 0.0,
+                      until: Optional[float] = None, limit: int = 1000) -> List[PricePoint]:
+        """Serie de precios de un juego (por appid de Steam, URL de la tienda o nombre), en orden cronológico."""
+        if not self.enabled:
+            return []
+        if appid is not None:
+            where, params = "appid = ?", (appid,)
+        elif url is not None:
+            where, params = "url = ?", (url,)
+        else:
+            where, params = "name_norm = ?", (_normalize_text(name or ""),)
+        if store is not None:
+            where, params = where + " AND store = ?", params + (store,)
+        if cc is not None:
+            where, params = where + " AND cc = ?", params + (cc,)
+        try:
+            return await asyncio.to_thread(self._history_sync, where, params, since, until or time.time(), limit)
+        except sqlite3.Error as e:
+            logger.warning("Price store history failed: %s", e)
+            return []
+
+
+price_store = PriceStore()
@@ -1,12 +1,28 @@
+import asyncio
+import json
+import time
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from api.schemas import Suggestion, Preview, GamePrice
-from api.steam import store_search, fetch_price_for_app
-from api.nuuvem import nuuvem_search_v2, nuuvem_fetch_v2
-from api.cheapshark import cheapshark_search
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Optional
+from api.schemas import Suggestion, Preview, GamePrice, Comparison, PricePoint
+from api.steam import store_search, fetch_price_for_app, fetch_prices_for_apps
 from api.greenmangaming import gmg_search
 from api.instantgaming import instantgaming_search
+from api.catalog import steam_catalog
+from api.stores import (
+    steam_to_price,
+    instantgaming_to_price,
+    nuuvem_prices,
+    fanatical_prices,
+    gmg_prices,
+    instantgaming_prices,
+    compare_stores,
+    iter_stores,
+)
 from api.utils import _normalize_text
+from api.breaker import breaker_states
+from api import cache, deadline, metrics, tracing
+from api.pricestore import price_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,8 +36,33 @@ async def health():
     return {"status": "ok"}
 
 
+@router.get("/breakers")
+async def breakers():
+    """Estado de los circuit breakers por tienda (tasa de error, latencias, timeout actual)."""
+    return breaker_states()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @router.get("/autocomplete", response_model=List[Suggestion])
-async def autocomplete(q: str = Query(..., min_length=1), limit: int = Query(8, ge=1, le=20), cc: str = Query("co", min_length=2, max_length=2)):
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=20),
+    cc: str = Query("co", min_length=2, max_length=2,
+                    description="Solo mientras el catálogo local no está cargado (se pregunta a Steam para ese país)"),
+):
+    """Sugerencias por nombre. Con el catálogo local cargado no dependen del país: el catálogo
+    (GetAppList) no tiene datos por región, así que `cc` solo se usa al consultar a Steam."""
+    # Con el catálogo local cargado no hace falta llamar a Steam en cada tecla
+    if steam_catalog.ready:
+        return [
+            Suggestion(appid=appid, nombre=name, tiny_image=f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/capsule_sm_120.jpg")
+            for appid, name in steam_catalog.search(q, limit)
+        ]
     try:
         items = await store_search(q, cc, limit)
     except Exception as e:
@@ -75,106 +116,69 @@ async def preview(appid: int = Query(...), cc: str = Query("co", min_length=2, m
 
 @router.get('/search', response_model=List[GamePrice])
 async def search(q: str = Query(..., min_length=1), limit: int = Query(5, ge=1, le=20), cc: str = Query('co', min_length=2, max_length=2)):
+    return await search_prices(q, cc, limit)
+
+
+async def search_prices(q: str, cc: str = 'co', limit: int = 5) -> List[GamePrice]:
+    """Lo que responde /search: base de precios si es reciente; si no, Steam + Instant Gaming."""
+    if not cache.is_refreshing():
+        stored = await price_store.fresh('search', cc, q, limit)
+        if stored is not None:
+            return stored
+    with deadline.tracking_errors() as errors:
+        results = await _search(q, cc, limit)
+    # Sin guardar lo recortado por el presupuesto ni lo que falta por un error tragado
+    if not errors and not deadline.exhausted():
+        # En /search los resultados con appid son de Steam y el resto viene de Instant Gaming
+        price_store.record('search', cc, q, limit, results, ['steam' if p.appid else 'instantgaming' for p in results])
+    return results
+
+
+async def _search(q: str, cc: str, limit: int) -> List[GamePrice]:
     try:
         items = await store_search(q, cc, limit)
     except Exception as e:
+        if deadline.exhausted():
+            return []
         raise HTTPException(status_code=502, detail=str(e))
 
-    results = []
-
     # Si Steam no devolvió nada, intentar Instant Gaming como fallback
     if not items:
         try:
             ig_candidates = await instantgaming_search(q, limit)
-        except Exception:
+        except Exception as e:
+            deadline.note_error(e)
             ig_candidates = []
+        return [p for p in (instantgaming_to_price(c, q) for c in ig_candidates) if p]
 
-        for cand in ig_candidates:
-            if not cand or not cand.get('precio'):
-                continue
+    # appdetails de todos los items y la búsqueda en Instant Gaming (para el merge) en paralelo
+    store_datas, ig_candidates = await asyncio.gather(
+        fetch_prices_for_apps([item.get("id") for item in items], cc),
+        instantgaming_search(q, limit),
+        return_exceptions=True,
+    )
+    if isinstance(store_datas, BaseException):
+        deadline.note_error(store_datas)
+        store_datas = [{} for _ in items]
+    if isinstance(ig_candidates, BaseException):
+        logger.debug('instantgaming_search failed while merging: %s', ig_candidates)
+        deadline.note_error(ig_candidates)
+        ig_candidates = []
 
-            results.append(GamePrice(
-                appid=0,
-                nombre=cand.get('nombre') or q,
-                precio_final=round(cand.get('precio') or 0.0, 2),
-                precio_original=round(cand.get('precio_original'), 2) if cand.get('precio_original') else None,
-                porcentaje_descuento=int(cand.get('porcentaje_descuento', 0) or 0),
-                moneda=cand.get('moneda') or 'EUR',
-                steam_url=cand.get('url'),
-                tiny_image=cand.get('tiny_image') or ''
-            ))
-
-        return results
-
-    results = []
-    for item in items:
-        appid = item.get("id")
-        name = item.get("name")
-        try:
-            store_data = await fetch_price_for_app(appid, cc)
-        except Exception:
-            store_data = {}
-
-        if store_data.get("is_free"):
-            image = item.get("tiny_image") or store_data.get("header_image") or store_data.get("capsule_image") or f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg"
-            results.append(GamePrice(
-                appid=appid,
-                nombre=name,
-                precio_final=0.0,
-                precio_original=None,
-                porcentaje_descuento=0,
-                moneda=store_data.get("currency", item.get("price", {}).get("currency", "COP")),
-                steam_url=f"https://store.steampowered.com/app/{appid}/",
-                tiny_image=image,
-            ))
-            continue
-
-        price = store_data.get("price_overview") or item.get("price")
-        if not price:
-            continue
-
-        final = price.get("final", 0) / 100
-        initial = price.get("initial", 0) / 100
-        discount = price.get("discount_percent", 0)
-
-        image = item.get("tiny_image") or store_data.get("header_image") or store_data.get("capsule_image") or f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg"
-        results.append(GamePrice(
-            appid=appid,
-            nombre=name,
-            precio_final=round(final, 2),
-            precio_original=round(initial, 2) if initial != final else None,
-            porcentaje_descuento=discount,
-            moneda=price.get("currency"),
-            steam_url=f"https://store.steampowered.com/app/{appid}/",
-            tiny_image=image,
-        ))
+    results = [p for p in (steam_to_price(item, data) for item, data in zip(items, store_datas)) if p]
 
     # Merge Instant Gaming results into the final result set (deduplicate by normalized title)
-    try:
-        ig_candidates = await instantgaming_search(q, limit)
-    except Exception as e:
-        ig_candidates = []
-        logger.debug('instantgaming_search failed while merging: %s', e)
-
     if ig_candidates:
         logger.debug('Merging Instant Gaming candidates (%s) into search results for query=%s', len(ig_candidates), q)
         existing_norm = set(_normalize_text(r.nombre) for r in results if getattr(r, 'nombre', None))
         for cand in ig_candidates:
-            if not cand or not cand.get('precio'):
+            price = instantgaming_to_price(cand, q)
+            if not price:
                 continue
             n = _normalize_text(cand.get('nombre') or '')
             if n in existing_norm:
                 continue
-            results.append(GamePrice(
-                appid=0,
-                nombre=cand.get('nombre') or q,
-                precio_final=round(cand.get('precio') or 0.0, 2),
-                precio_original=round(cand.get('precio_original'), 2) if cand.get('precio_original') else None,
-                porcentaje_descuento=int(cand.get('porcentaje_descuento', 0) or 0),
-                moneda=cand.get('moneda') or 'EUR',
-                steam_url=cand.get('url'),
-                tiny_image=cand.get('tiny_image') or ''
-            ))
+            results.append(price)
             existing_norm.add(n)
 
     if len(results) > limit:
@@ -185,71 +189,22 @@ async def search(q: str = Query(..., min_length=1), limit: int = Query(5, ge=1,
 
 @router.get('/nuuvem', response_model=List[GamePrice])
 async def nuuvem(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2)):
-    results = []
     try:
-        candidates = await nuuvem_search_v2(q, limit)
+        return await nuuvem_prices(q, cc, limit)
     except Exception as e:
         logger.warning('nuuvem_search_v2 failed: %s', e)
-        return results
-
-    for cand in candidates:
-        info = None
-        if cand.get('precio_detectado'):
-            info = {
-                'nombre': cand.get('nombre'),
-                'precio_final': cand.get('precio_detectado'),
-                'precio_original': None,
-                'porcentaje_descuento': 0,
-                'moneda': cand.get('moneda'),
-                'tiny_image': cand.get('tiny_image') or '',
-                'url': cand.get('url')
-            }
-        else:
-            try:
-                info = await nuuvem_fetch_v2(cand)
-            except Exception:
-                continue
-
-        if not info or not info.get('precio_final'):
-            continue
-
-        results.append(GamePrice(
-            appid=0,
-            nombre=info.get('nombre') or cand.get('nombre') or q,
-            precio_final=round(info.get('precio_final') or 0.0, 2),
-            precio_original=round(info.get('precio_original'), 2) if info.get('precio_original') else None,
-            porcentaje_descuento=info.get('porcentaje_descuento', 0),
-            moneda=info.get('moneda') or 'COP',
-            steam_url=info.get('url'),
-            tiny_image=info.get('tiny_image') or ''
-        ))
-
-    return results
+        return []
 
 
 @router.get('/fanatical', response_model=List[GamePrice])
 async def fanatical(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2)):
-    results = []
     try:
-        candidates = await cheapshark_search(q, limit)
+        results = await fanatical_prices(q, cc, limit)
     except Exception as e:
+        # Con CheapShark caído se sigue intentando el fallback a Instant Gaming
         logger.warning('cheapshark_search failed: %s', e)
-        return results
-
-    for cand in candidates:
-        if not cand or not cand.get('precio_final'):
-            continue
-
-        results.append(GamePrice(
-            appid=0,
-            nombre=cand.get('nombre') or q,
-            precio_final=round(cand.get('precio_final') or 0.0, 2),
-            precio_original=round(cand.get('original_price'), 2) if cand.get('original_price') else None,
-            porcentaje_descuento=int(cand.get('descuento', 0) or 0),
-            moneda='USD',
-            steam_url=cand.get('url'),
-            tiny_image=cand.get('tiny_image') or ''
-        ))
+        deadline.note_error(e)
+        results = []
 
     if not results:
         try:
@@ -257,50 +212,18 @@ async def fanatical(q: str = Query(..., min_length=1), limit: int = Query(3, ge=
         except Exception as e:
             logger.debug('instantgaming_search fallback failed: %s', e)
             return results
-        for cand in ig_candidates:
-            if not cand or not cand.get('precio'):
-                continue
-            results.append(GamePrice(
-                appid=0,
-                nombre=cand.get('nombre') or q,
-                precio_final=round(cand.get('precio') or 0.0, 2),
-                precio_original=round(cand.get('precio_original'), 2) if cand.get('precio_original') else None,
-                porcentaje_descuento=int(cand.get('porcentaje_descuento', 0) or 0),
-                moneda=cand.get('moneda') or 'EUR',
-                steam_url=cand.get('url'),
-                tiny_image=cand.get('tiny_image') or ''
-            ))
-            if len(results) >= limit:
-                break
+        results = [p for p in (instantgaming_to_price(c, q) for c in ig_candidates) if p][:limit]
 
     return results
 
 
 @router.get('/greenmangaming', response_model=List[GamePrice])
 async def greenmangaming(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2)):
-    results = []
     try:
-        candidates = await gmg_search(q, limit)
+        return await gmg_prices(q, cc, limit)
     except Exception as e:
         logger.warning('gmg_search failed: %s', e)
-        return results
-
-    for cand in candidates:
-        if not cand or not cand.get('precio'):
-            continue
-        moneda = cand.get('moneda') or 'USD'
-        results.append(GamePrice(
-            appid=0,
-            nombre=cand.get('nombre') or q,
-            precio_final=round(cand.get('precio') or 0.0, 2),
-            precio_original=round(cand.get('precio_original'), 2) if cand.get('precio_original') else None,
-            porcentaje_descuento=int(cand.get('porcentaje_descuento', 0) or 0),
-            moneda=moneda,
-            steam_url=cand.get('url'),
-            tiny_image=cand.get('tiny_image') or ''
-        ))
-
-    return results
+        return []
 
 @router.get('/greenmangaming/debug')
 async def greenmangaming_debug(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10)):
@@ -314,29 +237,11 @@ async def greenmangaming_debug(q: str = Query(..., min_length=1), limit: int = Q
 
 @router.get('/instantgaming', response_model=List[GamePrice])
 async def instantgaming(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2)):
-    results = []
     try:
-        candidates = await instantgaming_search(q, limit)
+        return await instantgaming_prices(q, cc, limit)
     except Exception as e:
         logger.warning('instantgaming_search failed: %s', e)
-        return results
-
-    for cand in candidates:
-        if not cand or not cand.get('precio'):
-            continue
-
-        results.append(GamePrice(
-            appid=0,
-            nombre=cand.get('nombre') or q,
-            precio_final=round(cand.get('precio') or 0.0, 2),
-            precio_original=round(cand.get('precio_original'), 2) if cand.get('precio_original') else None,
-            porcentaje_descuento=int(cand.get('porcentaje_descuento', 0) or 0),
-            moneda=cand.get('moneda') or 'EUR',
-            steam_url=cand.get('url'),
-            tiny_image=cand.get('tiny_image') or ''
-        ))
-
-    return results
+        return []
 
 
 @router.get('/instantgaming/debug')
@@ -346,4 +251,77 @@ async def instantgaming_debug(q: str = Query(..., min_length=1), limit: int = Qu
         candidates = await instantgaming_search(q, limit)
         return candidates
     except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@router.get('/debug/traces')
+async def debug_traces(limit: int = Query(20, ge=1, le=200)):
+    """Debug: últimas peticiones con su duración y el resumen de spans por nombre."""
+    return [
+        {k: v for k, v in trace.to_dict().items() if k != 'spans'}
+        for trace in tracing.recent_traces()[:limit]
+    ]
+
+
+@router.get('/debug/traces/{request_id}')
+async def debug_trace(request_id: str):
+    """Debug: desglose completo (spans de upstream, parseo y tiendas) de la petición con ese X-Request-Id."""
+    trace = tracing.get_trace(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail='Trace not found')
+    return trace.to_dict()
+
+
+@router.get('/history', response_model=List[PricePoint])
+async def history(
+    appid: Optional[int] = Query(None, description='appid de Steam'),
+    url: Optional[str] = Query(None, description='URL del juego en la tienda'),
+    q: Optional[str] = Query(None, min_length=1, description='Nombre exacto del juego (normalizado), en todas las tiendas'),
+    store: Optional[str] = Query(None),
+    cc: Optional[str] = Query(None, min_length=2, max_length=2),
+    days: float = Query(90, gt=0, le=3650),
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """Precios observados de un juego en orden cronológico (appid, url o q; opcionalmente por tienda y país)."""
+    if appid is None and url is None and q is None:
+        raise HTTPException(status_code=400, detail='Indica appid, url o q')
+    return await price_store.history(appid=appid, url=url, name=q, store=store, cc=cc,
+                                     since=time.time() - days * 86400, limit=limit)
+
+
+@router.get('/compare', response_model=Comparison)
+async def compare(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2)):
+    """Todas las tiendas en una sola llamada; cada tienda tiene su propio deadline (STORE_TIMEOUTS)."""
+    start = time.perf_counter()
+    stores = await compare_stores(q, cc, limit)
+    return Comparison(query=q, cc=cc, elapsed_ms=int((time.perf_counter() - start) * 1000), partial=deadline.exhausted(), stores=stores)
+
+
+def _stream_event(fmt: str, event: str, data: dict) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"event": event, **data}, ensure_ascii=False) + "\n"
+
+
+@router.get('/compare/stream')
+async def compare_stream(q: str = Query(..., min_length=1), limit: int = Query(3, ge=1, le=10), cc: str = Query('co', min_length=2, max_length=2), format: str = Query('ndjson', pattern='^(ndjson|sse)$')):
+    """Igual que /compare pero en streaming (NDJSON o SSE): un evento `store` por tienda según
+    van terminando y un evento final `summary`."""
+
+    async def events():
+        start = time.perf_counter()
+        statuses = {}
+        async for result in iter_stores(q, cc, limit):
+            statuses[result.store] = result.status
+            yield _stream_event(format, 'store', result.model_dump())
+        yield _stream_event(format, 'summary', {
+            'query': q,
+            'cc': cc,
+            'elapsed_ms': int((time.perf_counter() - start) * 1000),
+            'partial': deadline.exhausted(),
+            'stores': statuses,
+        })
+
+    media_type = 'text/event-stream' if format == 'sse' else 'application/x-ndjson'
+    return StreamingResponse(events(), media_type=media_type, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -28,4 +29,33 @@ class Preview(BaseModel):
     moneda: Optional[str] = "COP"
     is_free: bool = False
     steam_url: str
-    tiny_image: str = ""
\ No newline at end of file
+    tiny_image: str = ""
+
+
+class StoreResult(BaseModel):
+    store: str
+    status: str = "ok"  # ok | timeout | error
+    elapsed_ms: int = 0
+    results: List[GamePrice] = []
+    error: Optional[str] = None
+
+
+class Comparison(BaseModel):
+    query: str
+    cc: str
+    elapsed_ms: int = 0
+    partial: bool = False  # se agotó el presupuesto de la petición
+    stores: List[StoreResult] = []
+
+
+class PricePoint(BaseModel):
+    store: str
+    cc: str
+    observed_at: datetime
+    appid: int = 0
+    nombre: str
+    url: str
+    precio_final: float
+    precio_original: Optional[float] = None
+    porcentaje_descuento: int = 0
+    moneda: Optional[str] = None
@@ -1,35 +1,126 @@
-from typing import List
-from api.http_client import get_http_client
+import asyncio
+from typing import Dict, List, Iterable
+from api.http_client import upstream_get
+from api.concurrency import gather_bounded, BatchLoader
+from api.cache import cached
+from api.breaker import CircuitOpenError
+from api import deadline
 
 STORE_SEARCH_URL = "https://store.steampowered.com/api/storesearch/"
 STORE_APPDETAILS_URL = "https://store.steampowered.com/api/appdetails"
+# Máximo de peticiones appdetails simultáneas por búsqueda
+APPDETAILS_CONCURRENCY = 8
+STORE_SEARCH_CACHE_TTL = 10 * 60
+APPDETAILS_CACHE_TTL = 5 * 60
+# appdetails acepta varios appids solo con filters=price_overview: las consultas de precio de
+# todas las peticiones en vuelo se agrupan durante esta ventana (segundos) en una sola llamada
+PRICE_BATCH_WINDOW = 0.008
+PRICE_BATCH_MAX = 50
+# Se propagan tal cual (sin envolver en RuntimeError): quien llama las distingue de un fallo de Steam
+_PASSTHROUGH = (deadline.DeadlineExceeded, CircuitOpenError)
+
+
+class SteamAppUnavailable(RuntimeError):
+    """Steam respondió, pero sin datos para ese appid (success=false): no es un fallo de la tienda."""
 
 
 async def store_search(query: str, cc: str = "co", limit: int = 5) -> List[dict]:
-    client = await get_http_client()
+    return (await _store_search(query, cc))[:limit]
+
+
+# storesearch no tiene parámetro de límite: se cachea la lista completa y cada llamada recorta
+@cached("steam_search", ttl=STORE_SEARCH_CACHE_TTL)
+async def _store_search(query: str, cc: str = "co") -> List[dict]:
     params = {"term": query, "cc": cc, "l": "en"}
     try:
-        resp = await client.get(STORE_SEARCH_URL, params=params)
+        resp = await upstream_get("steam", STORE_SEARCH_URL, params=params)
         resp.raise_for_status()
         data = resp.json()
         items = data.get("items", [])
         exclude_keywords = ("soundtrack", "soundtracks", "demo", "demos", "extra", "extras")
-        filtered = [item for item in items if not any(kw in item.get("name", "").lower() for kw in exclude_keywords)]
-        return filtered[:limit]
+        return [item for item in items if not any(kw in item.get("name", "").lower() for kw in exclude_keywords)]
+    except _PASSTHROUGH:
+        raise
     except Exception as e:
         raise RuntimeError(f"Error searching Steam store: {e}")
 
 
+@cached("steam_appdetails", ttl=APPDETAILS_CACHE_TTL)
 async def fetch_price_for_app(appid: int, cc: str = "co") -> dict:
-    client = await get_http_client()
     params = {"appids": str(appid), "cc": cc, "l": "en"}
     try:
-        resp = await client.get(STORE_APPDETAILS_URL, params=params)
+        resp = await upstream_get("steam", STORE_APPDETAILS_URL, params=params)
         resp.raise_for_status()
         data = resp.json()
         appdata = data.get(str(appid), {})
-        if not appdata.get("success"):
-            raise RuntimeError("Steam store did not return success for this appid")
-        return appdata.get("data", {})
+    except _PASSTHROUGH:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Error fetching Steam store data: {e}")
+    if not appdata.get("success"):
+        raise SteamAppUnavailable("Steam store did not return success for this appid")
+    return appdata.get("data", {})
+
+
+async def _fetch_price_overviews(cc: str, appids: List[int]) -> Dict[int, object]:
+    params = {"appids": ",".join(str(a) for a in appids), "cc": cc, "l": "en", "filters": "price_overview"}
+    try:
+        resp = await upstream_get("steam", STORE_APPDETAILS_URL, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+    except _PASSTHROUGH:
+        raise
     except Exception as e:
-        raise RuntimeError(f"Error fetching Steam store data: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Error fetching Steam store data: {e}")
+
+    out: Dict[int, object] = {}
+    for appid in appids:
+        appdata = data.get(str(appid)) or {}
+        if not appdata.get("success"):
+            out[appid] = SteamAppUnavailable("Steam store did not return success for this appid")
+        else:
+            # Sin precio (gratis, no lanzado...) Steam devuelve data=[]
+            d = appdata.get("data")
+            out[appid] = d if isinstance(d, dict) else {}
+    return out
+
+
+_price_loaders: Dict[str, BatchLoader] = {}
+
+
+@cached("steam_price", ttl=APPDETAILS_CACHE_TTL)
+async def fetch_price_overview(appid: int, cc: str = "co") -> dict:
+    """Solo {"price_overview": ...} de un appid; se agrupa con las demás consultas del mismo cc."""
+    loader = _price_loaders.get(cc)
+    if loader is None:
+        loader = _price_loaders[cc] = BatchLoader(
+            lambda appids: _fetch_price_overviews(cc, appids), window=PRICE_BATCH_WINDOW, max_batch=PRICE_BATCH_MAX
+        )
+    return await loader.load(int(appid))
+
+
+async def fetch_prices_for_apps(appids: Iterable[int], cc: str = "co", concurrency: int = APPDETAILS_CONCURRENCY) -> List[dict]:
+    """Precios de varios appids; mismo orden que `appids` y {} si alguno falla.
+
+    Los precios salen del loader por lotes; solo los appids sin price_overview (p. ej. juegos
+    gratis) piden el appdetails completo para conocer `is_free`. Si un appid se queda en {} por
+    un fallo de Steam (no porque no tenga datos) se anota con note_error: la respuesta es parcial.
+    """
+    appids = list(appids)
+    datas = await asyncio.gather(*(fetch_price_overview(appid, cc) for appid in appids), return_exceptions=True)
+    failed = {i: d for i, d in enumerate(datas) if isinstance(d, BaseException)}
+    datas = [d if isinstance(d, dict) else {} for d in datas]
+
+    missing = [i for i, d in enumerate(datas) if not d.get("price_overview")]
+    if missing:
+        details = await gather_bounded(lambda i: fetch_price_for_app(appids[i], cc), missing, concurrency)
+        for i, d in zip(missing, details):
+            if isinstance(d, dict):
+                datas[i] = d
+                failed.pop(i, None)
+            else:
+                failed[i] = d
+    for error in failed.values():
+        if not isinstance(error, SteamAppUnavailable):
+            deadline.note_error(error)
+    return datas
@@ -0,0 +1,270 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from api.schemas import GamePrice, StoreResult
+from api.steam import store_search, fetch_prices_for_apps
+from api.nuuvem import nuuvem_search_v2, nuuvem_fetch_v2
+from api.cheapshark import cheapshark_search
+from api.greenmangaming import gmg_search
+from api.instantgaming import instantgaming_search
+from api.concurrency import gather_bounded
+from api import cache, deadline, metrics, tracing
+from api.pricestore import price_store
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo (segundos) que /compare espera a cada tienda antes de darla por perdida
+STORE_TIMEOUTS: Dict[str, float] = {
+    "steam": 6.0,
+    "nuuvem": 10.0,
+    "fanatical": 8.0,
+    "greenmangaming": 12.0,
+    "instantgaming": 10.0,
+}
+
+
+def _observed(store: str):
+    """Registra en /metrics (y como span) la duración y el número de resultados de una tienda."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                with tracing.span(f"store.{store}"):
+                    results = await fn(*args, **kwargs)
+                outcome = "ok"
+                metrics.store_results.observe(len(results), store)
+                return results
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                metrics.store_duration.observe(time.perf_counter() - start, store, outcome)
+
+        return wrapper
+
+    return decorator
+
+
+def _persisted(store: str):
+    """Responde desde la base de precios si la misma búsqueda es reciente; si no, llama a la
+    tienda y guarda lo obtenido (salvo que el presupuesto de la petición lo haya recortado o
+    que haya fallado: un error o un resultado incompleto por errores tragados no se guarda)."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(q: str, cc: str = 'co', limit: int = 3) -> List[GamePrice]:
+            if not cache.is_refreshing():
+                stored = await price_store.fresh(store, cc, q, limit)
+                if stored is not None:
+                    return stored
+            with deadline.tracking_errors() as errors:
+                results = await fn(q, cc, limit)
+            if not errors and not deadline.exhausted():
+                price_store.record(store, cc, q, limit, results)
+            return results
+
+        return wrapper
+
+    return decorator
+
+
+def _steam_image(appid: int, item: dict, store_data: dict) -> str:
+    return item.get("tiny_image") or store_data.get("header_image") or store_data.get("capsule_image") or f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg"
+
+
+def steam_to_price(item: dict, store_data: dict) -> Optional[GamePrice]:
+    """GamePrice a partir de un item de storesearch y su appdetails (None si no hay precio)."""
+    appid = item.get("id")
+    name = item.get("name")
+
+    if store_data.get("is_free"):
+        return GamePrice(
+            appid=appid,
+            nombre=name,
+            precio_final=0.0,
+            precio_original=None,
+            porcentaje_descuento=0,
+            moneda=store_data.get("currency", item.get("price", {}).get("currency", "COP")),
+            steam_url=f"https://store.steampowered.com/app/{appid}/",
+            tiny_image=_steam_image(appid, item, store_data),
+        )
+
+    price = store_data.get("price_overview") or item.get("price")
+    if not price:
+        return None
+
+    final = price.get("final", 0) / 100
+    initial = price.get("initial", 0) / 100
+    discount = price.get("discount_percent", 0)
+
+    return GamePrice(
+        appid=appid,
+        nombre=name,
+        precio_final=round(final, 2),
+        precio_original=round(initial, 2) if initial != final else None,
+        porcentaje_descuento=discount,
+        moneda=price.get("currency"),
+        steam_url=f"https://store.steampowered.com/app/{appid}/",
+        tiny_image=_steam_image(appid, item, store_data),
+    )
+
+
+def candidate_to_price(cand: dict, q: str, moneda: str, price_key: str = 'precio',
+                       original_key: str = 'precio_original', discount_key: str = 'porcentaje_descuento') -> Optional[GamePrice]:
+    """GamePrice a partir de un candidato de una tienda scrapeada (None si no tiene precio)."""
+    if not cand or not cand.get(price_key):
+        return None
+    return GamePrice(
+        appid=0,
+        nombre=cand.get('nombre') or q,
+        precio_final=round(cand.get(price_key) or 0.0, 2),
+        precio_original=round(cand.get(original_key), 2) if cand.get(original_key) else None,
+        porcentaje_descuento=int(cand.get(discount_key, 0) or 0),
+        moneda=cand.get('moneda') or moneda,
+        steam_url=cand.get('url'),
+        tiny_image=cand.get('tiny_image') or ''
+    )
+
+
+def instantgaming_to_price(cand: dict, q: str) -> Optional[GamePrice]:
+    return candidate_to_price(cand, q, 'EUR')
+
+
+def gmg_to_price(cand: dict, q: str) -> Optional[GamePrice]:
+    return candidate_to_price(cand, q, 'USD')
+
+
+def fanatical_to_price(cand: dict, q: str) -> Optional[GamePrice]:
+    # CheapShark siempre devuelve USD
+    return candidate_to_price(dict(cand, moneda='USD'), q, 'USD', price_key='precio_final',
+                              original_key='original_price', discount_key='descuento')
+
+
+def nuuvem_to_price(info: dict, cand: dict, q: str) -> Optional[GamePrice]:
+    if not info or not info.get('precio_final'):
+        return None
+    return candidate_to_price(dict(info, nombre=info.get('nombre') or cand.get('nombre')), q, 'COP', price_key='precio_final')
+
+
+@_observed("steam")
+@_persisted("steam")
+async def steam_prices(q: str, cc: str = 'co', limit: int = 5) -> List[GamePrice]:
+    """Solo Steam: storesearch + appdetails en paralelo (sin merge con Instant Gaming)."""
+    items = await store_search(q, cc, limit)
+    store_datas = await fetch_prices_for_apps([item.get("id") for item in items], cc)
+    prices = (steam_to_price(item, data) for item, data in zip(items, store_datas))
+    return [p for p in prices if p]
+
+
+async def _nuuvem_info(cand: dict) -> Optional[dict]:
+    if cand.get('precio_detectado'):
+        return {
+            'nombre': cand.get('nombre'),
+            'precio_final': cand.get('precio_detectado'),
+            'precio_original': None,
+            'porcentaje_descuento': 0,
+            'moneda': cand.get('moneda'),
+            'tiny_image': cand.get('tiny_image') or '',
+            'url': cand.get('url')
+        }
+    return await nuuvem_fetch_v2(cand)
+
+
+@_observed("nuuvem")
+@_persisted("nuuvem")
+async def nuuvem_prices(q: str, cc: str = 'co', limit: int = 3) -> List[GamePrice]:
+    candidates = await nuuvem_search_v2(q, limit)
+    infos = await gather_bounded(_nuuvem_info, candidates, limit=4)
+    failed = [info for info in infos if isinstance(info, BaseException)]
+    # Fallaron todas las páginas de producto: es un error, no "sin precios"
+    if candidates and len(failed) == len(candidates):
+        raise failed[0]
+    for error in failed:
+        deadline.note_error(error)
+    prices = (
+        nuuvem_to_price(info, cand, q)
+        for info, cand in zip(infos, candidates)
+        if isinstance(info, dict)
+    )
+    return [p for p in prices if p]
+
+
+@_observed("fanatical")
+@_persisted("fanatical")
+async def fanatical_prices(q: str, cc: str = 'co', limit: int = 3) -> List[GamePrice]:
+    candidates = await cheapshark_search(q, limit)
+    return [p for p in (fanatical_to_price(c, q) for c in candidates) if p]
+
+
+@_observed("greenmangaming")
+@_persisted("greenmangaming")
+async def gmg_prices(q: str, cc: str = 'co', limit: int = 3) -> List[GamePrice]:
+    candidates = await gmg_search(q, limit)
+    return [p for p in (gmg_to_price(c, q) for c in candidates) if p]
+
+
+@_observed("instantgaming")
+@_persisted("instantgaming")
+async def instantgaming_prices(q: str, cc: str = 'co', limit: int = 3) -> List[GamePrice]:
+    candidates = await instantgaming_search(q, limit)
+    return [p for p in (instantgaming_to_price(c, q) for c in candidates) if p]
+
+
+# Orden en que se presentan las tiendas en /compare
+STORES: Dict[str, Callable[[str, str, int], Awaitable[List[GamePrice]]]] = {
+    "steam": steam_prices,
+    "nuuvem": nuuvem_prices,
+    "fanatical": fanatical_prices,
+    "greenmangaming": gmg_prices,
+    "instantgaming": instantgaming_prices,
+}
+
+
+async def run_store(store: str, q: str, cc: str = 'co', limit: int = 3) -> StoreResult:
+    """Ejecuta una tienda con su deadline (acotado por el presupuesto de la petición) y nunca
+    lanza: el fallo queda en `status`."""
+    start = time.perf_counter()
+    store_timeout = STORE_TIMEOUTS.get(store, 10.0)
+    timeout = deadline.clamp(store_timeout)
+    try:
+        results = await asyncio.wait_for(STORES[store](q, cc, limit), timeout)
+        status, error = "ok", None
+    except asyncio.TimeoutError:
+        if timeout < store_timeout:
+            deadline.mark_exhausted()
+        results, status, error = [], "timeout", None
+    except Exception as e:
+        logger.warning('%s failed in compare: %s', store, e)
+        results, status, error = [], "error", str(e)
+    return StoreResult(
+        store=store,
+        status=status,
+        elapsed_ms=int((time.perf_counter() - start) * 1000),
+        results=results[:limit],
+        error=error,
+    )
+
+
+async def compare_stores(q: str, cc: str = 'co', limit: int = 3) -> List[StoreResult]:
+    """Todas las tiendas en paralelo; cada una respeta su propio deadline."""
+    return list(await asyncio.gather(*(run_store(store, q, cc, limit) for store in STORES)))
+
+
+async def iter_stores(q: str, cc: str = 'co', limit: int = 3) -> AsyncIterator[StoreResult]:
+    """Como compare_stores, pero entrega cada tienda en cuanto termina (la más rápida primero)."""
+    tasks = [asyncio.ensure_future(run_store(store, q, cc, limit)) for store in STORES]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Si el cliente se desconecta a mitad del stream se dejan de esperar las tiendas que faltan.
+        # Las cargas de la caché (api/cache.py) no se cancelan: son compartidas y terminan en
+        # segundo plano (con su propio límite) para que su resultado quede guardado
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,156 @@
+import contextvars
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Spans por petición: se resumen en la cabecera Server-Timing (visible en las devtools del
+# navegador) y las últimas TRACE_BUFFER trazas se pueden consultar en /debug/traces/{id}.
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", "200"))
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    __slots__ = ("request_id", "method", "path", "start", "spans", "duration", "status")
+
+    def __init__(self, request_id: str, method: str = "", path: str = ""):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        # (nombre, inicio relativo, duración, atributos)
+        self.spans: List[tuple] = []
+        self.duration: Optional[float] = None
+        self.status: Optional[int] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self) -> Dict[str, dict]:
+        """Por nombre de span: llamadas, suma de duraciones y tiempo de reloj cubierto
+        (los spans concurrentes no se suman dos veces)."""
+        by_name: Dict[str, list] = {}
+        for name, start, dur, _ in self.spans:
+            by_name.setdefault(name, []).append((start, start + dur))
+        out = {}
+        for name, intervals in by_name.items():
+            intervals.sort()
+            wall, cur_start, cur_end = 0.0, None, None
+            for s, e in intervals:
+                if cur_end is None or s > cur_end:
+                    if cur_end is not None:
+                        wall += cur_end - cur_start
+                    cur_start, cur_end = s, e
+                else:
+                    cur_end = max(cur_end, e)
+            if cur_end is not None:
+                wall += cur_end - cur_start
+            out[name] = {"count": len(intervals), "sum_ms": sum(e - s for s, e in intervals) * 1000, "wall_ms": wall * 1000}
+        return out
+
+    def server_timing(self) -> str:
+        parts = []
+        for name, agg in self.summary().items():
+            parts.append(f'{name};dur={agg["wall_ms"]:.1f};desc="{agg["count"]}x, {agg["sum_ms"]:.1f}ms total"')
+        parts.append(f"app;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round((self.duration if self.duration is not None else self.elapsed()) * 1000, 1),
+            "summary": {name: {k: round(v, 1) for k, v in agg.items()} for name, agg in self.summary().items()},
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 1), "duration_ms": round(dur * 1000, 1), **attrs}
+                for name, start, dur, attrs in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_recent: "OrderedDict[str, Trace]" = OrderedDict()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[dict]:
+    """Mide el bloque como un span de la traza actual. Devuelve el dict de atributos para
+    poder completarlo dentro del bloque (p. ej. el status). Sin traza no hace nada."""
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        end = time.perf_counter()
+        trace.spans.append((name, start - trace.start, end - start, attrs))
+
+
+def detach() -> None:
+    """Quita la traza del contexto actual (tareas en segundo plano que sobreviven a la petición)."""
+    _current.set(None)
+
+
+def get_trace(request_id: str) -> Optional[Trace]:
+    return _recent.get(request_id)
+
+
+def recent_traces() -> List[Trace]:
+    return list(reversed(_recent.values()))
+
+
+def _remember(trace: Trace) -> None:
+    _recent[trace.request_id] = trace
+    _recent.move_to_end(trace.request_id)
+    while len(_recent) > TRACE_BUFFER:
+        _recent.popitem(last=False)
+
+
+class TracingMiddleware:
+    """ASGI: abre una traza por petición, añade `Server-Timing` y `X-Request-Id` a la
+    respuesta y la guarda para /debug/traces."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                value = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(value):
+                    request_id = value
+                break
+        trace = Trace(request_id or uuid.uuid4().hex[:16], scope["method"], scope["path"])
+        token = _current.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", trace.server_timing().encode("latin-1")),
+                    (REQUEST_ID_HEADER, trace.request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            trace.duration = trace.elapsed()
+            # Las rutas de depuración no se guardan para no desplazar las trazas interesantes
+            if not scope["path"].startswith("/debug/"):
+                _remember(trace)
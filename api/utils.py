@@ -1,15 +1,74 @@
 import re
 import unicodedata
-from difflib import SequenceMatcher
+from typing import Iterable, List, Optional
+
+# Umbral de similitud (Dice sobre trigramas) a partir del cual dos títulos se consideran el mismo juego
+MIN_TITLE_SIMILARITY = 0.3
+
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
 
 
 def _normalize_text(s: str) -> str:
-    s = (s or "").lower().strip()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = re.sub(r"[^a-z0-9 ]+", " ", s)
-    return re.sub(r"\s+", " ", s).strip()
+    s = (s or "").lower()
+    # Los títulos ASCII (la mayoría) no necesitan quitar acentos
+    if not s.isascii():
+        s = unicodedata.normalize("NFKD", s)
+        s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _NON_ALNUM_RE.sub(" ", s).strip()
+
+
+def _trigrams(s: str) -> frozenset:
+    s = f"  {s} "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+
+def _trigram_positions(s: str) -> int:
+    """Posiciones de trigrama de `s` con el mismo relleno que _trigrams (len(f"  {s} ") - 2)."""
+    return len(s) + 1
+
+
+class TitleMatcher:
+    """Decide si un título de tienda corresponde a la búsqueda.
+
+    Se construye una vez por query (normalización, palabras y trigramas precalculados) y
+    luego se evalúa contra cada candidato. Un título casa si contiene la query, si contiene
+    al menos `min_word_ratio` de sus palabras (None = no usar esta regla) o si la similitud
+    Dice de trigramas llega a `min_similarity`.
+    """
+
+    def __init__(self, query: str, min_similarity: float = MIN_TITLE_SIMILARITY, min_word_ratio: Optional[float] = 0.5):
+        self.query = _normalize_text(query)
+        self.min_similarity = min_similarity
+        words = [w for w in self.query.split() if len(w) >= 2]
+        self._words = words if min_word_ratio is not None else []
+        self._min_words = max(1, len(words) * (min_word_ratio or 0))
+        self._grams = _trigrams(self.query)
+
+    def similarity(self, title_norm: str) -> float:
+        # Dice: los trigramas de la query se buscan directamente en el título (sin construir
+        # su conjunto); el título cuenta con todas sus posiciones de trigrama
+        padded = f"  {title_norm} "
+        n_title = _trigram_positions(title_norm)
+        n_query = len(self._grams)
+        shared = sum(1 for g in self._grams if g in padded)
+        return 2 * shared / (n_query + n_title)
 
+    def matches(self, title: str) -> bool:
+        if not self.query or not title:
+            return False
+        title_norm = _normalize_text(title)
+        if not title_norm:
+            return False
+        if self.query in title_norm:
+            return True
+        if self._words and sum(1 for w in self._words if w in title_norm) >= self._min_words:
+            return True
+        # Cota superior de Dice según longitudes: títulos mucho más largos no pueden llegar
+        n_query, n_title = len(self._grams), _trigram_positions(title_norm)
+        if 2 * min(n_query, n_title) < self.min_similarity * (n_query + n_title):
+            return False
+        return self.similarity(title_norm) >= self.min_similarity
 
-def _similar(a: str, b: str) -> float:
-    return SequenceMatcher(None, a, b).ratio()
\ No newline at end of file
+    def filter(self, titles: Iterable[str]) -> List[bool]:
+        return [self.matches(t) for t in titles]
@@ -0,0 +1,22 @@
+import random
+
+from api.utils import TitleMatcher, _normalize_text
+
+
+def test_similarity_edge_case_is_not_pruned():
+    # Todos los trigramas de la query están en el título y la similitud queda justo sobre el umbral
+    matcher = TitleMatcher("aaaa")
+    title = "aaa bbbbbbbbbbbbbbbbb"
+    assert matcher.similarity(_normalize_text(title)) >= matcher.min_similarity
+    assert matcher.matches(title)
+
+
+def test_length_pruning_never_rejects_a_similar_title():
+    rnd = random.Random(1234)
+    for _ in range(20000):
+        query = "".join(rnd.choice("ab ") for _ in range(rnd.randint(1, 10)))
+        title = "".join(rnd.choice("ab ") for _ in range(rnd.randint(1, 40)))
+        matcher = TitleMatcher(query, min_word_ratio=None)
+        title_norm = _normalize_text(title)
+        if matcher.query and title_norm and matcher.similarity(title_norm) >= matcher.min_similarity:
+            assert matcher.matches(title), (query, title)
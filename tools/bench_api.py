@@ -0,0 +1,223 @@
+"""Benchmark offline del API: la app real de api/main.py contra tiendas simuladas.
+
+Las llamadas a Steam, CheapShark, Nuuvem, GreenManGaming e Instant Gaming las responde un
+httpx.MockTransport con las páginas de tools/bench_fixtures.py, con latencia y jitter
+configurables. Mide p50/p95/p99 y throughput por endpoint y, con --baseline, falla
+(exit 1) si algún p95 empeora más de --max-regression respecto a una ejecución anterior.
+
+Uso:
+    python tools/bench_api.py [--requests 100] [--concurrency 10] [--latency 80] [--jitter 40]
+                              [--cache cold|warm] [--endpoints search,compare]
+                              [--json out.json] [--baseline out.json --max-regression 0.25]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import unquote_plus
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Antes de importar la app: sin red ni estado en data/
+os.environ.setdefault("GMG_SLUG_CACHE_PATH", str(Path(tempfile.mkdtemp(prefix="gph-bench-")) / "gmg_slugs.json"))
+os.environ.setdefault("STEAM_APPLIST_URL", "")
+os.environ.setdefault("HTTP_PREWARM", "0")
+# Sin base de precios: cada petición mide el camino hasta las tiendas (simuladas)
+os.environ.setdefault("PRICESTORE_PATH", "")
+
+import httpx  # noqa: E402
+
+import bench_fixtures as fx  # noqa: E402
+from api import http_client  # noqa: E402
+from api.cache import response_cache  # noqa: E402
+from api.main import app  # noqa: E402
+
+# Endpoint -> parámetros (la query se añade en cada petición)
+ENDPOINTS = {
+    "search": ("/search", {"limit": 5}),
+    "nuuvem": ("/nuuvem", {"limit": 3}),
+    "fanatical": ("/fanatical", {"limit": 3}),
+    "greenmangaming": ("/greenmangaming", {"limit": 3}),
+    "instantgaming": ("/instantgaming", {"limit": 3}),
+    "compare": ("/compare", {"limit": 3}),
+    "autocomplete": ("/autocomplete", {}),
+}
+QUERIES = ["elden ring", "hollow knight", "baldurs gate", "cyberpunk", "stardew valley", "hades", "celeste", "portal"]
+# Las tiendas que se scrapean son más lentas que las APIs JSON
+HOST_LATENCY_FACTOR = {
+    "store.steampowered.com": 1.0,
+    "www.cheapshark.com": 1.2,
+    "www.nuuvem.com": 2.0,
+    "www.greenmangaming.com": 2.5,
+    "www.instant-gaming.com": 2.0,
+}
+
+
+class MockStores:
+    """Responde como cada tienda; cuenta las peticiones por host."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, seed: int = 1):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rnd = random.Random(seed)
+        self.calls = {}
+        self._cheapshark_titles = {}
+
+    def _delay(self, host: str) -> float:
+        base = self.latency * HOST_LATENCY_FACTOR.get(host, 1.0)
+        # Cola exponencial: la mayoría cerca de la base y algunas bastante más lentas
+        return base + (self.rnd.expovariate(1 / self.jitter) if self.jitter > 0 else 0)
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        url = request.url
+        host, path, params = url.host, url.path, url.params
+        if host == "store.steampowered.com":
+            if path.startswith("/api/storesearch"):
+                return httpx.Response(200, json=fx.steam_storesearch(params.get("term", "")))
+            if path.startswith("/api/appdetails"):
+                appids = params.get("appids", "").split(",")
+                if params.get("filters") == "price_overview":
+                    return httpx.Response(200, json=fx.steam_price_overviews(appids))
+                return httpx.Response(200, json=fx.steam_appdetails(appids[0]))
+        elif host == "www.cheapshark.com":
+            if "ids" in params:
+                ids = params["ids"].split(",")
+                return httpx.Response(200, json=fx.cheapshark_details({i: self._cheapshark_titles.get(i, f"Game {i}") for i in ids}))
+            games = fx.cheapshark_games(params.get("title", ""))
+            self._cheapshark_titles.update((g["gameID"], g["external"]) for g in games)
+            return httpx.Response(200, json=games)
+        elif host == "www.nuuvem.com":
+            if "/product/" in path:
+                return httpx.Response(200, text=fx.nuuvem_product(path))
+            if "search" in path:
+                query = params.get("q") or unquote_plus(path.rstrip("/").rsplit("/", 1)[-1])
+                return httpx.Response(200, text=fx.nuuvem_search(query))
+        elif host == "www.greenmangaming.com":
+            if "/search/" in path:
+                return httpx.Response(200, text=fx.gmg_search(params.get("query", "")))
+            # Solo existe la forma /es/games/{slug}-pc/ (la primera de SLUG_PATTERNS)
+            if path.startswith("/es/games/") and path.endswith("-pc/"):
+                return httpx.Response(200, text=fx.gmg_product(path.rstrip("/").rsplit("/", 1)[-1]))
+        elif host == "www.instant-gaming.com":
+            return httpx.Response(200, text=fx.instantgaming_search(params.get("query", "")))
+        return httpx.Response(404, text="<html><body>Not found</body></html>")
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.calls[host] = self.calls.get(host, 0) + 1
+        await asyncio.sleep(self._delay(host))
+        return self._respond(request)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_endpoint(client: httpx.AsyncClient, name: str, requests: int, concurrency: int, cache: str) -> dict:
+    path, params = ENDPOINTS[name]
+    latencies, errors, counter = [], 0, iter(range(requests))
+
+    if cache == "warm":
+        # Primera pasada fuera de la medición para llenar la caché
+        for q in QUERIES:
+            await client.get(path, params={**params, "q": q})
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            # cold: una query distinta en cada petición (nada cacheado); warm: las mismas de la primera pasada
+            q = QUERIES[i % len(QUERIES)] + (f" {i}" if cache == "cold" else "")
+            start = time.perf_counter()
+            try:
+                resp = await client.get(path, params={**params, "q": q})
+                if resp.status_code != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+        "rps": requests / wall if wall > 0 else 0.0,
+    }
+
+
+async def main_async(args) -> dict:
+    mock = MockStores(args.latency, args.jitter, args.seed)
+    http_client.set_transport(httpx.MockTransport(mock))
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        for name in args.endpoints:
+            response_cache.clear()
+            results[name] = await run_endpoint(client, name, args.requests, args.concurrency, args.cache)
+            r = results[name]
+            print(f"{name:<16}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['rps']:>9.1f}")
+    await http_client.close_http_client()
+    print("upstream calls:", ", ".join(f"{h}={n}" for h, n in sorted(mock.calls.items())))
+    return results
+
+
+def check_regressions(results: dict, baseline: dict, max_regression: float) -> list:
+    failed = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or base["p95_ms"] <= 0:
+            continue
+        ratio = r["p95_ms"] / base["p95_ms"]
+        if ratio > 1 + max_regression:
+            failed.append(f"{name}: p95 {r['p95_ms']:.1f} ms vs {base['p95_ms']:.1f} ms (x{ratio:.2f})")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=100, help="peticiones por endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=80, help="latencia base de las tiendas (ms)")
+    parser.add_argument("--jitter", type=float, default=40, help="media de la cola exponencial de latencia (ms)")
+    parser.add_argument("--cache", choices=("cold", "warm"), default="cold")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    parser.add_argument("--baseline", help="resultados (--json) de una ejecución anterior con los que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="empeoramiento máximo del p95 (0.25 = 25%%)")
+    args = parser.parse_args()
+    args.endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in args.endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"endpoints desconocidos: {', '.join(unknown)}")
+
+    print(f"{args.requests} peticiones/endpoint, concurrencia {args.concurrency}, latencia {args.latency:.0f}+~{args.jitter:.0f} ms, caché {args.cache}")
+    print(f"{'endpoint':<16}{'n':>6}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}")
+    results = asyncio.run(main_async(args))
+
+    if args.json:
+        config = {k: getattr(args, k) for k in ("requests", "concurrency", "latency", "jitter", "cache", "seed")}
+        Path(args.json).write_text(json.dumps({"config": config, "results": results}, indent=2), encoding="utf-8")
+    if args.baseline:
+        failed = check_regressions(results, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.max_regression)
+        if failed:
+            print("REGRESIÓN:\n  " + "\n  ".join(failed))
+            sys.exit(1)
+        print(f"sin regresiones (p95 dentro de +{args.max_regression:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark: overhead por petición del middleware CORS (ASGI puro) frente al anterior con
+BaseHTTPMiddleware, en /health y /autocomplete (con un catálogo de apps en memoria).
+
+Llama a la app ASGI directamente (sin cliente HTTP ni sockets) para que lo que se mide sea
+el coste del middleware y de la ruta.
+
+Uso: python tools/bench_cors.py [--requests 5000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+
+from api import main as api_main  # noqa: E402
+from api.catalog import AppIndex, steam_catalog  # noqa: E402
+from api.routes import router  # noqa: E402
+
+ORIGIN = b"http://localhost:3000"
+
+
+class LegacyCorsMiddleware(BaseHTTPMiddleware):
+    """Réplica del CorsMiddleware anterior (BaseHTTPMiddleware, dict de cabeceras por petición)."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        origin = request.headers.get("origin", "").strip()
+        if api_main._ALLOWED_ORIGINS == {"*"}:
+            cors_headers = {**api_main._CORS_HEADERS, "Access-Control-Allow-Origin": "*"}
+        elif origin and origin in api_main._ALLOWED_ORIGINS:
+            cors_headers = {**api_main._CORS_HEADERS, "Access-Control-Allow-Origin": origin, "Access-Control-Allow-Credentials": "true"}
+        else:
+            cors_headers = {**api_main._CORS_HEADERS, "Access-Control-Allow-Origin": next(iter(api_main._ALLOWED_ORIGINS), ""),
+                            "Access-Control-Allow-Credentials": "true"}
+        if request.method == "OPTIONS":
+            return Response(status_code=200, headers=cors_headers)
+        response = await call_next(request)
+        for key, value in cors_headers.items():
+            response.headers[key] = value
+        return response
+
+
+def build_app(middleware):
+    app = FastAPI()
+    if middleware is not None:
+        app.add_middleware(middleware)
+    app.include_router(router)
+    return app
+
+
+async def call(app, method: str, path: str, query: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query, "root_path": "",
+        "headers": [(b"host", b"bench"), (b"origin", ORIGIN), (b"access-control-request-method", b"GET")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def bench(app, method, path, query, n) -> float:
+    for _ in range(50):
+        await call(app, method, path, query)
+    start = time.perf_counter()
+    for _ in range(n):
+        await call(app, method, path, query)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main_async(n: int):
+    steam_catalog.index = AppIndex((i, f"{w} {i}") for i, w in enumerate(["Elden Ring", "Hades", "Portal", "Celeste"] * 5000))
+    apps = {
+        "sin CORS": build_app(None),
+        "BaseHTTPMiddleware": build_app(LegacyCorsMiddleware),
+        "ASGI puro": build_app(api_main.CorsMiddleware),
+    }
+    cases = [("GET", "/health", b""), ("GET", "/autocomplete", b"q=elden"), ("OPTIONS", "/autocomplete", b"q=elden")]
+    print(f"{n} peticiones por caso (us/petición)")
+    print(f"{'caso':<26}" + "".join(f"{name:>20}" for name in apps))
+    for method, path, query in cases:
+        row = [await bench(app, method, path, query, n) for app in apps.values()]
+        print(f"{method + ' ' + path:<26}" + "".join(f"{us:>20.1f}" for us in row))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.requests))
+
+
+if __name__ == "__main__":
+    main()
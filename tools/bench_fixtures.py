@@ -0,0 +1,188 @@
+"""Páginas y respuestas de prueba con la estructura que esperan los extractores de cada tienda.
+
+No son capturas reales: imitan el markup que leen api/nuuvem.py, api/greenmangaming.py e
+api/instantgaming.py y la forma de las respuestas JSON de Steam y CheapShark, con relleno
+(menús, scripts, pie) para que el tamaño se parezca al de una página de verdad.
+Las usan tools/bench_api.py y tools/bench_parsers.py.
+"""
+import hashlib
+import html
+import random
+import re
+from typing import Dict, List
+
+EDITIONS = ["", " Deluxe Edition", " Gold Edition", " Season Pass", " Complete Edition", " Soundtrack", " Bundle"]
+OTHER_TITLES = [
+    "Hades", "Hollow Knight", "Stardew Valley", "Terraria", "Celeste", "Dead Cells", "Portal 2",
+    "Cyberpunk 2077", "The Witcher 3 Wild Hunt", "Red Dead Redemption 2", "Baldur's Gate 3",
+    "Resident Evil 4", "Forza Horizon 5", "Sekiro Shadows Die Twice", "Monster Hunter World",
+]
+
+
+def _rng(*parts) -> random.Random:
+    seed = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+    return random.Random(int(seed, 16))
+
+
+def _slug(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+
+
+def _noise(kb: int, seed: str) -> List[str]:
+    """Relleno de ~kb KB (bloques de navegación, banners y scripts inline)."""
+    if kb <= 0:
+        return []
+    rnd = _rng("noise", seed)
+    chunks, size = [], 0
+    while size < kb * 1024:
+        kind = rnd.random()
+        if kind < 0.4:
+            part = "<nav><ul>" + "".join(
+                f'<li class="menu-item"><a href="/es/categoria/{rnd.randint(1, 999)}/">Categoría {rnd.randint(1, 99)}</a></li>'
+                for _ in range(10)
+            ) + "</ul></nav>"
+        elif kind < 0.8:
+            part = '<section class="banner"><div class="banner__inner"><p>' + " ".join(
+                rnd.choice(OTHER_TITLES) for _ in range(20)
+            ) + "</p></div></section>"
+        else:
+            part = "<script>window.__STATE__=" + repr([rnd.random() for _ in range(40)]) + ";</script>"
+        chunks.append(part)
+        size += len(part)
+    return chunks
+
+
+def _page(body: str, title: str, noise_kb: int, seed: str, image: str = "") -> str:
+    noise = _noise(noise_kb, seed)
+    half = len(noise) // 2
+    header, footer = "".join(noise[:half]), "".join(noise[half:])
+    og = f'<meta property="og:image" content="{image}">' if image else ""
+    return (
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>{og}</head>"
+        f"<body><header>{header}</header><main>{body}</main><footer>{footer}</footer></body></html>"
+    )
+
+
+def titles_for(query: str, n: int) -> List[str]:
+    """Títulos que devolvería una tienda para `query`: el juego, sus ediciones y algo de ruido."""
+    base = query.strip().title() or "Game"
+    rnd = _rng("titles", query)
+    out = [base + ed for ed in EDITIONS]
+    while len(out) < n:
+        out.append(rnd.choice(OTHER_TITLES))
+    return out[:n]
+
+
+def steam_storesearch(query: str, n: int = 10) -> Dict:
+    items = []
+    for i, title in enumerate(titles_for(query, n)):
+        appid = 100000 + int(hashlib.md5(title.encode("utf-8")).hexdigest()[:5], 16)
+        items.append({
+            "type": "app",
+            "id": appid,
+            "name": title,
+            "tiny_image": f"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/{appid}/capsule_231x87.jpg",
+            "price": {"currency": "COP", "initial": 22990000, "final": 16093000},
+        })
+    return {"total": len(items), "items": items}
+
+
+def steam_price_overviews(appids: List[str]) -> Dict:
+    out = {}
+    for appid in appids:
+        rnd = _rng("steam", appid)
+        initial = rnd.choice([59900, 99900, 179900, 229900]) * 100
+        discount = rnd.choice([0, 0, 10, 25, 50])
+        out[appid] = {"success": True, "data": {"price_overview": {
+            "currency": "COP",
+            "initial": initial,
+            "final": initial * (100 - discount) // 100,
+            "discount_percent": discount,
+            "initial_formatted": "",
+            "final_formatted": "",
+        }}}
+    return out
+
+
+def steam_appdetails(appid: str) -> Dict:
+    data = steam_price_overviews([appid])[appid]["data"]
+    data.update({"name": f"App {appid}", "is_free": False, "header_image": f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/header.jpg"})
+    return {appid: {"success": True, "data": data}}
+
+
+def cheapshark_games(query: str, n: int = 20) -> List[Dict]:
+    """/games?title=: gameID derivado del título para poder resolver luego /games?ids=."""
+    return [
+        {"gameID": cheapshark_id(title), "steamAppID": None, "cheapest": "9.99", "cheapestDealID": f"deal{i}",
+         "external": title, "internalName": _slug(title).replace("-", "").upper(), "thumb": f"https://img/cs{i}.jpg"}
+        for i, title in enumerate(titles_for(query, n))
+    ]
+
+
+def cheapshark_id(title: str) -> str:
+    return str(int(hashlib.md5(title.encode("utf-8")).hexdigest()[:7], 16))
+
+
+def cheapshark_details(titles_by_id: Dict[str, str]) -> Dict:
+    """/games?ids=: ofertas de varias tiendas (incluida Fanatical, storeID 15) por juego."""
+    out = {}
+    for game_id, title in titles_by_id.items():
+        rnd = _rng("cs", game_id)
+        retail = rnd.choice([19.99, 29.99, 59.99])
+        deals = [{"storeID": store, "dealID": f"{game_id}-{store}", "price": f"{retail * rnd.uniform(0.4, 1):.2f}",
+                  "retailPrice": f"{retail:.2f}", "savings": "0"} for store in ("1", "7", "15", "25")]
+        out[game_id] = {"info": {"title": title, "thumb": f"https://img/cs{game_id}.jpg"}, "deals": deals}
+    return out
+
+
+def nuuvem_search(query: str, n: int = 24, noise_kb: int = 120) -> str:
+    cards = []
+    for i, title in enumerate(titles_for(query, n)):
+        price = f'<div class="product-price--val"><span>COL$ {_rng("nv", title).randint(20, 250)}.900</span></div>' if i % 2 == 0 else ""
+        cards.append(
+            f'<div><a href="/co-es/product/games/{_slug(title)}-{i}"><img src="https://img/nv{i}.jpg">'
+            f'<h3 class="game-card__product-name">{html.escape(title)}</h3>{price}</a></div>'
+        )
+    return _page('<div class="nvm-grid">' + "".join(cards) + "</div>", f"Busca: {query} | Nuuvem", noise_kb, "nuuvem-search" + query)
+
+
+def nuuvem_product(path: str, noise_kb: int = 200) -> str:
+    name = path.rstrip("/").rsplit("/", 1)[-1].rsplit("-", 1)[0].replace("-", " ").title()
+    body = (
+        f'<h1>{html.escape(name)}</h1>'
+        f'<div class="product-price--val"><span class="product-price--old">COL$ 229.900</span><span>COL$ {_rng("nvp", path).randint(20, 200)}.900</span></div>'
+    )
+    return _page(body, f"{name} | Nuuvem", noise_kb, "nuuvem-product" + path, f"https://img/nv-{_slug(name)}.jpg")
+
+
+def gmg_product(slug: str, noise_kb: int = 250) -> str:
+    name = slug.replace("-pc", "").replace("-", " ").upper()
+    price = _rng("gmg", slug).randint(50, 200)
+    body = (
+        f'<h1>{html.escape(name)}</h1>'
+        f'<gmgprice type="currentPrice">COP {price}.900</gmgprice><gmgprice type="rrp">COP 229.900</gmgprice>'
+    )
+    return _page(body, f"{name} - PC | Green Man Gaming", noise_kb, "gmg-product" + slug, f"https://img/gmg-{slug}.jpg")
+
+
+def gmg_search(query: str, n: int = 12, noise_kb: int = 150) -> str:
+    links = "".join(
+        f'<a class="product-item" href="/es/games/{_slug(title)}-pc/">{html.escape(title)}</a>'
+        for title in titles_for(query, n)
+    )
+    return _page(f'<div class="search-results">{links}</div>', f"Buscar {query} | Green Man Gaming", noise_kb, "gmg-search" + query)
+
+
+def instantgaming_search(query: str, n: int = 40, noise_kb: int = 150) -> str:
+    items = []
+    for i, title in enumerate(titles_for(query, n)):
+        rnd = _rng("ig", title, i)
+        price = rnd.uniform(5, 60)
+        # Precios en formato europeo: 39,99 €
+        old = f'<div class="old-price">{price * 1.6:.2f} €</div>'.replace(".", ",") if i % 3 == 0 else ""
+        price_txt = f"{price:.2f}".replace(".", ",") + " €"
+        items.append(
+            f'<article class="item"><a class="cover" href="/es/{5000 + i}-comprar-{_slug(title)}-pc-steam/" title="Comprar {html.escape(title)}">'
+            f'<img data-src="https://img/ig{i}.jpg"></a><div class="price">{price_txt}</div>{old}</article>'
+        )
+    return _page('<div class="search">' + "".join(items) + "</div>", f"Buscar {query} - Instant Gaming", noise_kb, "ig-search" + query)
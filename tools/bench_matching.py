@@ -0,0 +1,81 @@
+"""Benchmark: TitleMatcher (trigramas) vs. el matching anterior con difflib.SequenceMatcher.
+
+Uso: python tools/bench_matching.py [--candidates 1000] [--repeat 20]
+"""
+import argparse
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.utils import TitleMatcher, _normalize_text  # noqa: E402
+
+REAL_TITLES = [
+    "Elden Ring", "Elden Ring Nightreign", "Elden Ring Shadow of the Erdtree", "Dark Souls III",
+    "Hades", "Hades II", "Hollow Knight", "Hollow Knight Silksong", "The Witcher 3 Wild Hunt",
+    "Cyberpunk 2077", "Red Dead Redemption 2", "Baldur's Gate 3", "God of War Ragnarök",
+    "Marvel's Spider-Man Remastered", "Final Fantasy VII Remake", "Resident Evil 4",
+    "Counter-Strike 2", "Blasphemous 2", "Stardew Valley", "Terraria", "Forza Horizon 5",
+]
+QUERIES = ["elden ring", "eldn ring", "hades", "hollow knight", "witcher 3", "cyberpnk", "baldurs gate", "spiderman", "resident evil 4", "stardew"]
+
+
+def legacy_matches(query: str, title: str, thresh: float = 0.35, word_ratio: float = 0.5) -> bool:
+    """Réplica de los helpers _title_matches_query/_titulo_similar anteriores."""
+    q_norm = _normalize_text(query)
+    t_norm = _normalize_text(title)
+    if not q_norm or not t_norm:
+        return False
+    if q_norm in t_norm:
+        return True
+    words = [w for w in q_norm.split() if len(w) >= 2]
+    if words and sum(1 for w in words if w in t_norm) >= max(1, len(words) * word_ratio):
+        return True
+    return SequenceMatcher(None, q_norm, t_norm).ratio() >= thresh
+
+
+def make_candidates(n: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    vocab = [w for t in REAL_TITLES for w in t.split()] + ["Deluxe", "Edition", "Bundle", "Season", "Pass", "Collection", "Legends", "Chronicles", "Tactics", "Arena"]
+    out = list(REAL_TITLES)
+    while len(out) < n:
+        out.append(" ".join(rnd.sample(vocab, rnd.randint(1, 5))))
+    rnd.shuffle(out)
+    return out[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    candidates = make_candidates(args.candidates)
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        legacy = [[legacy_matches(q, c) for c in candidates] for q in QUERIES]
+    t_legacy = (time.perf_counter() - t0) / args.repeat
+
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        new = [TitleMatcher(q).filter(candidates) for q in QUERIES]
+    t_new = (time.perf_counter() - t0) / args.repeat
+
+    total = len(QUERIES) * len(candidates)
+    agree = sum(a == b for la, lb in zip(legacy, new) for a, b in zip(la, lb))
+    only_legacy = sum(a and not b for la, lb in zip(legacy, new) for a, b in zip(la, lb))
+    only_new = sum(b and not a for la, lb in zip(legacy, new) for a, b in zip(la, lb))
+
+    print(f"{len(QUERIES)} queries x {len(candidates)} candidatos")
+    print(f"SequenceMatcher: {t_legacy * 1000:8.2f} ms/ronda  ({t_legacy / total * 1e6:.2f} us/candidato)")
+    print(f"TitleMatcher:    {t_new * 1000:8.2f} ms/ronda  ({t_new / total * 1e6:.2f} us/candidato)")
+    print(f"speedup: x{t_legacy / t_new:.1f}")
+    print(f"misma decisión: {agree / total:.1%}  (solo legacy acepta: {only_legacy}, solo nuevo acepta: {only_new})")
+
+
+if __name__ == "__main__":
+    main()
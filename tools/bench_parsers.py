@@ -0,0 +1,149 @@
+"""Micro-benchmark de los extractores HTML de cada tienda, por página y por backend de BeautifulSoup.
+
+Mide, para cada página del corpus y cada parser instalado (lxml, html.parser, html5lib):
+tiempo de parseo (mediana y mínimo de --repeat ejecuciones), memoria pico, memoria que queda
+pendiente del GC y memoria retenida (tracemalloc, en una pasada aparte para no falsear los
+tiempos) y número de resultados, para detectar de paso si dos backends no extraen lo mismo.
+
+Corpus: archivos `<caso>__<nombre>.html` en --corpus (por defecto tools/corpus/), donde <caso>
+es uno de CASES y <nombre> la query con guiones (p. ej. `nuuvem_search__elden-ring.html`).
+Si la carpeta no existe o está vacía se usan las páginas sintéticas de bench_fixtures.py;
+`--save-corpus` las escribe en la carpeta para poder añadir al lado páginas guardadas de verdad.
+
+Uso: python tools/bench_parsers.py [--corpus DIR] [--repeat 20] [--parsers lxml,html.parser] [--json out.json]
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import bench_fixtures as fx  # noqa: E402
+from api import greenmangaming, instantgaming, nuuvem  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "corpus"
+
+# caso -> función(html, query, parser) que llama al extractor puro como lo hace el adaptador
+CASES = {
+    "nuuvem_search": lambda html, q, parser: nuuvem._parse_search_page(html, q, 5, parser=parser),
+    "nuuvem_product": lambda html, q, parser: [nuuvem._parse_product_page(html, {"nombre": q}, parser=parser)],
+    "gmg_product": lambda html, q, parser: [greenmangaming._extract_from_page_text(html, parser=parser)],
+    "gmg_search": lambda html, q, parser: greenmangaming._parse_search_links(html, 8, parser=parser),
+    "instantgaming_search": lambda html, q, parser: instantgaming._parse_search_page(
+        html, q, instantgaming.INSTANTGAMING_MAX_RESULTS, parser=parser),
+}
+SYNTHETIC_QUERIES = ["elden ring", "hollow knight", "baldurs gate 3"]
+
+
+def available_parsers():
+    """Backends de BeautifulSoup instalados (html.parser siempre lo está)."""
+    return [name for name in ("lxml", "html.parser", "html5lib")
+            if name == "html.parser" or importlib.util.find_spec(name) is not None]
+
+
+def synthetic_corpus():
+    pages = []
+    for q in SYNTHETIC_QUERIES:
+        slug = q.replace(" ", "-")
+        pages += [
+            ("nuuvem_search", slug, fx.nuuvem_search(q)),
+            ("nuuvem_product", slug, fx.nuuvem_product(f"/co-es/product/games/{slug}-0")),
+            ("gmg_product", slug, fx.gmg_product(f"{slug}-pc")),
+            ("gmg_search", slug, fx.gmg_search(q)),
+            ("instantgaming_search", slug, fx.instantgaming_search(q)),
+        ]
+    return pages
+
+
+def load_corpus(path: Path):
+    pages = []
+    for f in sorted(path.glob("*.html")):
+        case, _, name = f.stem.partition("__")
+        if case in CASES:
+            pages.append((case, name or f.stem, f.read_text(encoding="utf-8", errors="replace")))
+    return pages
+
+
+def measure(fn, html: str, query: str, parser: str, repeat: int) -> dict:
+    fn(html, query, parser)  # calentamiento
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = fn(html, query, parser)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        kept = fn(html, query, parser)
+        current, peak = tracemalloc.get_traced_memory()
+        # El árbol de BeautifulSoup tiene ciclos (padre <-> hijos): sigue en memoria hasta que pasa el GC
+        gc.collect()
+        collected, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "peak_kb": (peak - before) / 1024,
+        "garbage_kb": (current - collected) / 1024,
+        "retained_kb": (collected - before) / 1024,
+        "results": sum(1 for r in results if r),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--parsers", help="lista separada por comas (por defecto todos los instalados)")
+    ap.add_argument("--save-corpus", action="store_true", help="escribir las páginas sintéticas en --corpus y salir")
+    ap.add_argument("--json", help="guardar los resultados en este archivo")
+    args = ap.parse_args()
+
+    if args.save_corpus:
+        args.corpus.mkdir(parents=True, exist_ok=True)
+        for case, name, html in synthetic_corpus():
+            (args.corpus / f"{case}__{name}.html").write_text(html, encoding="utf-8")
+        print(f"corpus sintético escrito en {args.corpus}")
+        return
+
+    pages = load_corpus(args.corpus) if args.corpus.is_dir() else []
+    source = str(args.corpus)
+    if not pages:
+        pages, source = synthetic_corpus(), "sintético (bench_fixtures.py)"
+    parsers = [p.strip() for p in args.parsers.split(",")] if args.parsers else available_parsers()
+
+    print(f"corpus: {source} ({len(pages)} páginas), parsers: {', '.join(parsers)}, {args.repeat} repeticiones")
+    print(f"{'caso':<22}{'página':<16}{'KB':>6}  {'parser':<12}{'med ms':>9}{'min ms':>9}{'pico KB':>10}{'GC KB':>8}{'ret KB':>8}{'res':>5}")
+    rows = []
+    totals = {p: 0.0 for p in parsers}
+    for case, name, html in pages:
+        counts = set()
+        for parser in parsers:
+            r = measure(CASES[case], html, name.replace("-", " "), parser, args.repeat)
+            totals[parser] += r["median_ms"]
+            counts.add(r["results"])
+            rows.append({"case": case, "page": name, "kb": len(html) / 1024, "parser": parser, **r})
+            print(f"{case:<22}{name[:15]:<16}{len(html) / 1024:>6.0f}  {parser:<12}{r['median_ms']:>9.2f}{r['min_ms']:>9.2f}"
+                  f"{r['peak_kb']:>10.0f}{r['garbage_kb']:>8.0f}{r['retained_kb']:>8.1f}{r['results']:>5}")
+        if len(counts) > 1:
+            print(f"  ! {case}/{name}: los parsers no extraen el mismo número de resultados")
+
+    print("total (suma de medianas): " + ", ".join(f"{p} {t:.1f} ms" for p, t in totals.items()))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"corpus": source, "rows": rows}, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()